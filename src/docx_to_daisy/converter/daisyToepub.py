@@ -1,21 +1,82 @@
 import zipfile
 import os
 import uuid
-import argparse
 import re
 import logging
 import html
 from lxml import etree
+from lxml.builder import ElementMaker
 from datetime import datetime
 import shutil
-from docx_to_daisy.markers import MarkerProcessor
-import gc
+from functools import lru_cache
+from docx_to_daisy.converter.utils import stream_file_to_zip, iter_relative_files, PRECOMPRESSED_EXTENSIONS, IO_BUFSIZE, ZIP_OUTPUT_BUFSIZE
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=None, book_publisher=None, book_language="ko"):
+# XHTML 생성에 쓰는 네임스페이스
+XHTML_NS = "http://www.w3.org/1999/xhtml"
+OPS_NS = "http://www.idpf.org/2007/ops"
+XML_LANG_ATTR = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# 컴파일된 정규식 패턴 및 조회 테이블 (성능 최적화)
+UID_SAFE_PATTERN = re.compile(r'[^a-zA-Z0-9_-]')
+# 파일명에 쓸 수 없는 문자 (Windows 예약 문자 및 제어 문자 포함)
+UNSAFE_FILENAME_PATTERN = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+WHITESPACE_RUN_PATTERN = re.compile(r'\s+')
+
+# EPUB 3.0 Core Media Type 이미지 확장자 -> MIME 타입
+IMAGE_MEDIA_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+}
+
+# 본문 텍스트 노드용 이스케이프 테이블 (따옴표는 속성값에서만 의미가 있으므로 제외)
+TEXT_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+def escape_text(text):
+    """요소 본문 텍스트를 한 번의 str.translate로 이스케이프합니다.
+
+    html.escape는 문자마다 5번의 replace를 수행하므로 단락/셀마다 호출되는 경로에서는
+    이 함수를 사용하고, 속성값(alt 등)에는 escape_cached(html.escape)를 사용합니다.
+    """
+    return text.translate(TEXT_ESCAPE_TABLE)
+
+
+@lru_cache(maxsize=4096)
+def escape_cached(text):
+    """html.escape 결과를 캐시합니다.
+
+    책 제목은 장마다 <title>에, 같은 이미지 alt나 저자명도 여러 파일에 반복해서 들어가므로
+    같은 문자열은 한 번만 이스케이프합니다.
+    """
+    return html.escape(text)
+
+
+@lru_cache(maxsize=None)
+def _dtbook_tag_kinds(dtbook_ns):
+    """DTBook 네임스페이스가 붙은 태그 이름을 처리 종류로 매핑하는 디스패치 테이블을 만듭니다.
+
+    요소마다 tag.endswith(...)로 문자열을 검사하는 대신 dict 조회 한 번으로 분기합니다.
+    """
+    kinds = {
+        f"{{{dtbook_ns}}}imggroup": 'imggroup',
+        f"{{{dtbook_ns}}}pagenum": 'pagenum',
+        f"{{{dtbook_ns}}}p": 'p',
+        f"{{{dtbook_ns}}}table": 'table',
+    }
+    for n in range(1, 7):
+        kinds[f"{{{dtbook_ns}}}h{n}"] = 'heading'
+    for n in range(2, 7):
+        kinds[f"{{{dtbook_ns}}}level{n}"] = 'level'
+    return kinds
+
+def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=None, book_publisher=None, book_language="ko", write_expanded=True):
     """DAISY 3.0 파일들을 EPUB 3.0 표준에 맞춰 변환합니다.
     
     EPUB 3.0 Core Media Types 지원:
@@ -39,6 +100,8 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
         book_author (str, optional): 저자. 기본값은 None (DAISY에서 추출)
         book_publisher (str, optional): 출판사. 기본값은 None (DAISY에서 추출)
         book_language (str, optional): 언어 코드 (ISO 639-1). 기본값은 "ko"
+        write_expanded (bool, optional): 압축 전 EPUB 폴더 구조도 output_dir에 기록할지 여부.
+            False이면 .epub 파일만 생성합니다. 기본값은 True
         
     Returns:
         str: 생성된 EPUB 파일의 전체 경로
@@ -46,8 +109,12 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
     
     # --- 출력 디렉토리 생성 ---
     os.makedirs(output_dir, exist_ok=True)
-    os.makedirs(os.path.join(output_dir, "EPUB"), exist_ok=True)
-    os.makedirs(os.path.join(output_dir, "META-INF"), exist_ok=True)
+    # EPUB 폴더 경로는 한 번만 계산하고, 루프 안에서는 접두사에 파일명만 이어 붙이기
+    epub_dir = os.path.join(output_dir, "EPUB")
+    epub_dir_prefix = epub_dir + os.sep
+    if write_expanded:
+        os.makedirs(epub_dir, exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "META-INF"), exist_ok=True)
 
     # --- DAISY 파일 읽기 ---
     dtbook_file = os.path.join(daisy_dir, "dtbook.xml")
@@ -57,16 +124,17 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
     if not os.path.exists(dtbook_file):
         raise FileNotFoundError(f"DTBook 파일을 찾을 수 없습니다: {dtbook_file}")
     
-    # DTBook XML 파싱
-    dtbook_tree = etree.parse(dtbook_file)
-    dtbook_root = dtbook_tree.getroot()
-    
     # 네임스페이스 정의
     dtbook_ns = "http://www.daisy.org/z3986/2005/dtbook/"
     dc_ns = "http://purl.org/dc/elements/1.1/"
     
-    # 메타데이터 추출
-    head = dtbook_root.find(f"{{{dtbook_ns}}}head")
+    # 메타데이터 추출 (성능 최적화)
+    # head는 book보다 앞에 오므로 head의 end 이벤트까지만 읽고 파일을 바로 닫습니다.
+    # (iterparse에 파일 경로를 넘기면 끝까지 읽지 않은 파서가 GC 전까지 파일을 잡고 있으므로 직접 열어서 넘김)
+    head = None
+    with open(dtbook_file, 'rb') as dtbook_fp:
+        for _, head in etree.iterparse(dtbook_fp, events=('end',), tag=f"{{{dtbook_ns}}}head"):
+            break
     if head is not None:
         # 기본 메타데이터 추출
         uid_elem = head.find(f"meta[@name='dtb:uid']")
@@ -89,9 +157,9 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
 
     # --- 1. mimetype 파일 생성 ---
     print("mimetype 파일 생성 중...")
-    mimetype_file = os.path.join(output_dir, "mimetype")
-    with open(mimetype_file, 'w', encoding='utf-8') as f:
-        f.write("application/epub+zip")
+    if write_expanded:
+        mimetype_file = os.path.join(output_dir, "mimetype")
+        write_utf8_file(mimetype_file, "application/epub+zip")
     
     # --- 2. container.xml 생성 ---
     print("container.xml 생성 중...")
@@ -104,32 +172,39 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
   </rootfiles>
 </container>'''
     
-    container_file = os.path.join(output_dir, "META-INF", "container.xml")
-    with open(container_file, 'w', encoding='utf-8', newline='\n') as f:
-        f.write(container_xml_content)
+    if write_expanded:
+        container_file = os.path.join(output_dir, "META-INF", "container.xml")
+        write_utf8_file(container_file, container_xml_content)
 
     # --- 3. 이미지 파일 복사 ---
     print("이미지 파일 복사 중...")
-    epub_dir = os.path.join(output_dir, "EPUB")
-    
     print(f"DAISY 루트 디렉토리: {daisy_dir}")
     print(f"EPUB 디렉토리: {epub_dir}")
     
     # DAISY 루트 디렉토리에서 이미지 파일 찾기
+    # (이름, MIME 타입, 원본 경로) 목록을 한 번만 만들어 복사/OPF manifest/EPUB ZIP에서 재사용
+    image_entries = []
     if os.path.exists(daisy_dir):
-        all_files = os.listdir(daisy_dir)
-        image_files = [f for f in all_files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.svg'))]
-        print(f"DAISY에서 발견된 이미지 파일들: {image_files}")
+        with os.scandir(daisy_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                # EPUB 3.0 Core Media Types만 지원
+                mime_type = IMAGE_MEDIA_TYPES.get(os.path.splitext(entry.name)[1].lower())
+                if mime_type is not None:
+                    image_entries.append((entry.name, mime_type, entry.path))
+        print(f"DAISY에서 발견된 이미지 파일들: {[name for name, _, _ in image_entries]}")
         
-        for image_file in image_files:
-            src_path = os.path.join(daisy_dir, image_file)
-            dst_path = os.path.join(epub_dir, image_file)
-            
-            try:
-                shutil.copy2(src_path, dst_path)
-                print(f"✅ EPUB Core Media Type 이미지 복사 성공: {image_file} (EPUB 폴더 직접)")
-            except Exception as e:
-                print(f"❌ 이미지 복사 실패: {image_file} - {e}")
+        if write_expanded:
+            for image_file, _, src_path in image_entries:
+                dst_path = epub_dir_prefix + image_file
+                
+                try:
+                    # 메타데이터(mtime/권한) 보존이 필요 없으므로 copyfile로 커널 고속 복사 사용
+                    shutil.copyfile(src_path, dst_path)
+                    print(f"✅ EPUB Core Media Type 이미지 복사 성공: {image_file} (EPUB 폴더 직접)")
+                except Exception as e:
+                    print(f"❌ 이미지 복사 실패: {image_file} - {e}")
     else:
         print(f"❌ DAISY 디렉토리가 존재하지 않습니다: {daisy_dir}")
 
@@ -151,7 +226,7 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
     if navmap is None:
         raise ValueError("NCX에서 navMap을 찾을 수 없습니다.")
     
-    nav_points = navmap.findall(f"{{{ncx_ns}}}navPoint")
+    nav_points = list(navmap.iterchildren(f"{{{ncx_ns}}}navPoint"))
     print(f"총 {len(nav_points)}개의 navPoint 발견")
     
     # --- 5. Title Page 생성 ---
@@ -164,14 +239,15 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
     title_xhtml = create_title_page_xhtml(book_title, book_author, book_publisher, book_language)
     
     title_filename = "dtbook-1.xhtml"
-    title_filepath = os.path.join(output_dir, "EPUB", title_filename)
+    title_filepath = epub_dir_prefix + title_filename
     
-    with open(title_filepath, 'w', encoding='utf-8') as f:
-        f.write(title_xhtml)
+    if write_expanded:
+        write_utf8_file(title_filepath, title_xhtml)
     
     xhtml_files.append({
         'filename': title_filename,
         'filepath': title_filepath,
+        'content': title_xhtml,
         'title': book_title,
         'nav_point': None
     })
@@ -181,170 +257,183 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
     # --- 6. DTBook 구조 분석 및 XHTML 파일 생성 ---
     print("DTBook 구조 분석 중...")
     
-    # bodymatter 찾기
-    book = dtbook_root.find(f"{{{dtbook_ns}}}book")
-    bodymatter = book.find(f"{{{dtbook_ns}}}bodymatter") if book is not None else None
-    
-    if bodymatter is None:
-        raise ValueError("DTBook에서 bodymatter를 찾을 수 없습니다.")
-    
     # NCX 구조를 기반으로 XHTML 파일 생성
     current_file_index = 2  # title page 이후부터 시작
     
+    # NCX 태그 이름은 루프 밖에서 한 번만 만들기
+    nav_label_tag = f"{{{ncx_ns}}}navLabel"
+    content_tag = f"{{{ncx_ns}}}content"
+    text_tag = f"{{{ncx_ns}}}text"
+    
+    # level1 navPoint별 (navPoint, 제목 요소, DTBook ID)와 DTBook ID별 참조 수
+    # 참조가 남아 있는 level1은 다시 찾을 수 있도록 해제하지 않음
+    level1_targets = []
+    level1_refs = {}
     for nav_point in nav_points:
         if nav_point.get('class') == 'level1':
-            # level1 navPoint 처리
-            nav_label = nav_point.find(f"{{{ncx_ns}}}navLabel")
-            content = nav_point.find(f"{{{ncx_ns}}}content")
-            
+            nav_label = nav_point.find(nav_label_tag)
+            content = nav_point.find(content_tag)
             if nav_label is not None and content is not None:
-                title = nav_label.find(f"{{{ncx_ns}}}text").text if nav_label.find(f"{{{ncx_ns}}}text") is not None else f"Section {current_file_index}"
-                content_src = content.get('src', '')
+                dtbook_id = dtbook_id_from_content_src(content.get('src', ''))
+                level1_targets.append((nav_point, nav_label, dtbook_id))
+                level1_refs[dtbook_id] = level1_refs.get(dtbook_id, 0) + 1
+    
+    # DTBook XML 스트리밍 파싱 (성능 최적화)
+    # 전체 트리를 한 번에 올리지 않고 level1의 end 이벤트만 받아
+    # level1 단위로 XHTML을 만든 뒤 바로 해제합니다.
+    # 파서를 끝까지 소진하지 않아도 with 블록을 벗어나면 DTBook 파일이 닫힙니다.
+    pending_level1 = {}  # NCX 순서보다 먼저 읽혔거나 다시 참조될 level1 보관용
+    fallback_state = {}  # level1이 아닌 요소를 가리킬 때만 만드는 전체 트리 id 색인
+    with open(dtbook_file, 'rb') as dtbook_fp:
+        dtbook_events = etree.iterparse(dtbook_fp, events=('end',), tag=f"{{{dtbook_ns}}}level1")
+        
+        for nav_point, nav_label, dtbook_id in level1_targets:
+            text_elem = nav_label.find(text_tag)
+            title = text_elem.text if text_elem is not None else f"Section {current_file_index}"
+            
+            # DTBook에서 해당 요소 찾기 (스트리밍 파서에서 필요한 만큼만 읽기)
+            target_element, streamed = find_level1_by_dtbook_id(
+                dtbook_events, pending_level1, level1_refs, dtbook_id,
+                dtbook_ns, dtbook_file, fallback_state
+            )
+            
+            if target_element is not None:
+                # XHTML 파일 생성 (DTBook 구조 기반)
+                xhtml_content = create_xhtml_from_nav_structure(
+                    target_element, current_file_index, 
+                    title, dtbook_ns, book_title, book_language
+                )
                 
-                # SMIL 파일에서 해당 ID 찾기
-                smil_id = content_src.split('#')[-1] if '#' in content_src else ''
+                filename = f"dtbook-{current_file_index}.xhtml"
+                filepath = epub_dir_prefix + filename
                 
-                # DTBook에서 해당 요소 찾기
-                target_element = find_element_by_smil_id(bodymatter, smil_id, dtbook_ns)
+                if write_expanded:
+                    write_utf8_file(filepath, xhtml_content)
                 
-                if target_element is not None:
-                    # XHTML 파일 생성 (DTBook 구조 기반)
-                    xhtml_content = create_xhtml_from_nav_structure(
-                        target_element, current_file_index, 
-                        title, dtbook_ns, book_title, book_language
-                    )
-                    
-                    filename = f"dtbook-{current_file_index}.xhtml"
-                    filepath = os.path.join(output_dir, "EPUB", filename)
-                    
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write(xhtml_content)
-                    
-                    xhtml_files.append({
-                        'filename': filename,
-                        'filepath': filepath,
-                        'title': title,
-                        'nav_point': nav_point
-                    })
-                    
-                    print(f"XHTML 파일 생성: {filename} - {title}")
-                    current_file_index += 1
+                xhtml_files.append({
+                    'filename': filename,
+                    'filepath': filepath,
+                    'content': xhtml_content,
+                    'title': title,
+                    'nav_point': nav_point
+                })
+                
+                print(f"XHTML 파일 생성: {filename} - {title}")
+                current_file_index += 1
+                
+            # 변환이 끝난 level1은 더 참조하는 navPoint가 없을 때만 해제하여 메모리 사용량 상한 유지
+            # (전체 트리 색인에서 찾은 요소는 다른 요소를 찾을 때 다시 쓰므로 해제하지 않음)
+            level1_refs[dtbook_id] -= 1
+            if streamed:
+                if level1_refs[dtbook_id] > 0:
+                    pending_level1[dtbook_id] = target_element
+                else:
+                    pending_level1.pop(dtbook_id, None)
+                    release_level1(target_element)
+        
+        if current_file_index == 2:
+            # 생성된 섹션이 없으면 남은 문서를 끝까지 읽어 bodymatter 존재 여부 확인
+            for _ in dtbook_events:
+                pass
+            dtbook_root = dtbook_events.root
+            book = dtbook_root.find(f"{{{dtbook_ns}}}book") if dtbook_root is not None else None
+            if book is None or book.find(f"{{{dtbook_ns}}}bodymatter") is None:
+                raise ValueError("DTBook에서 bodymatter를 찾을 수 없습니다.")
 
     # --- 5. package.opf 생성 ---
     print("package.opf 생성 중...")
     package_opf = create_package_opf(book_title, book_author, book_publisher, book_language, 
-                                   book_uid, xhtml_files, daisy_dir)
+                                   book_uid, xhtml_files, image_entries)
     
-    opf_filepath = os.path.join(output_dir, "EPUB", "package.opf")
-    with open(opf_filepath, 'w', encoding='utf-8') as f:
-        f.write(package_opf)
+    if write_expanded:
+        opf_filepath = epub_dir_prefix + "package.opf"
+        write_utf8_file(opf_filepath, package_opf)
     
     # --- 6. nav.xhtml 생성 ---
     print("nav.xhtml 생성 중...")
     nav_xhtml = create_nav_xhtml_from_ncx(book_title, nav_points, xhtml_files, ncx_ns, book_language)
     
-    nav_filepath = os.path.join(output_dir, "EPUB", "nav.xhtml")
-    with open(nav_filepath, 'w', encoding='utf-8') as f:
-        f.write(nav_xhtml)
+    if write_expanded:
+        nav_filepath = epub_dir_prefix + "nav.xhtml"
+        write_utf8_file(nav_filepath, nav_xhtml)
     
     # --- 7. CSS 파일 생성 ---
     print("CSS 파일 생성 중...")
     css_content = create_css_content()
     
-    css_filepath = os.path.join(output_dir, "EPUB", "zedai-css.css")
-    with open(css_filepath, 'w', encoding='utf-8') as f:
-        f.write(css_content)
+    if write_expanded:
+        css_filepath = epub_dir_prefix + "zedai-css.css"
+        write_utf8_file(css_filepath, css_content)
     
     # --- 8. zedai-mods.xml 생성 ---
     print("zedai-mods.xml 생성 중...")
     mods_content = create_mods_xml(book_title, book_author, book_language)
     
-    mods_filepath = os.path.join(output_dir, "EPUB", "zedai-mods.xml")
-    with open(mods_filepath, 'w', encoding='utf-8') as f:
-        f.write(mods_content)
+    if write_expanded:
+        mods_filepath = epub_dir_prefix + "zedai-mods.xml"
+        write_utf8_file(mods_filepath, mods_content)
     
-    print(f"\n--- EPUB3 파일 생성 완료 ---")
-    print(f"생성된 파일은 '{output_dir}' 폴더에 있습니다.")
+    if write_expanded:
+        print(f"\n--- EPUB3 파일 생성 완료 ---")
+        print(f"생성된 파일은 '{output_dir}' 폴더에 있습니다.")
     
     # --- EPUB3 ZIP 파일 생성 ---
-    # 안전한 파일명 생성 (특수문자 제거)
-    safe_title = re.sub(r'[<>:"/\\|?*]', '_', book_title).strip()
-    safe_title = re.sub(r'\s+', '_', safe_title)  # 공백을 언더스코어로 변경
-    safe_title = safe_title[:50]  # 파일명 길이 제한
-    if not safe_title:
-        safe_title = "untitled"
+    epub_filename = os.path.join(output_dir, f"{make_safe_filename(book_title)}.epub")
     
-    epub_filename = os.path.join(output_dir, f"{safe_title}.epub")
-    
-    with zipfile.ZipFile(epub_filename, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as epub_zip:
+    # XHTML/CSS는 레벨 1로도 압축률 차이가 거의 없고 CPU 시간은 크게 줄어듦 (성능 최적화)
+    with open(epub_filename, 'wb', buffering=ZIP_OUTPUT_BUFSIZE) as epub_out, \
+            zipfile.ZipFile(epub_out, 'w', zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=1) as epub_zip:
         # 1. mimetype 파일 (반드시 첫 번째, 압축하지 않음)
         epub_zip.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
         
-        # 2. META-INF/container.xml (경로 검증 후 추가)
-        container_path = os.path.join(output_dir, "META-INF", "container.xml")
-        if os.path.exists(container_path):
-            epub_zip.write(container_path, "META-INF/container.xml")
-        else:
-            raise FileNotFoundError(f"container.xml 파일을 찾을 수 없습니다: {container_path}")
+        # 디스크에 쓴 파일을 다시 읽지 않고 메모리의 내용을 바로 기록 (성능 최적화)
+        # 2. META-INF/container.xml
+        epub_zip.writestr("META-INF/container.xml", container_xml_content)
         
-        # 3. EPUB/package.opf (경로 검증 후 추가)
-        package_path = os.path.join(output_dir, "EPUB", "package.opf")
-        if os.path.exists(package_path):
-            epub_zip.write(package_path, "EPUB/package.opf")
-        else:
-            raise FileNotFoundError(f"package.opf 파일을 찾을 수 없습니다: {package_path}")
+        # 3. EPUB/package.opf
+        epub_zip.writestr("EPUB/package.opf", package_opf)
         
         # 4. EPUB/nav.xhtml
-        nav_path = os.path.join(output_dir, "EPUB", "nav.xhtml")
-        if os.path.exists(nav_path):
-            epub_zip.write(nav_path, "EPUB/nav.xhtml")
-        else:
-            raise FileNotFoundError(f"nav.xhtml 파일을 찾을 수 없습니다: {nav_path}")
+        epub_zip.writestr("EPUB/nav.xhtml", nav_xhtml)
         
         # 5. EPUB/zedai-css.css
-        css_path = os.path.join(output_dir, "EPUB", "zedai-css.css")
-        if os.path.exists(css_path):
-            epub_zip.write(css_path, "EPUB/zedai-css.css")
-        else:
-            raise FileNotFoundError(f"zedai-css.css 파일을 찾을 수 없습니다: {css_path}")
+        epub_zip.writestr("EPUB/zedai-css.css", css_content)
         
         # 6. EPUB/zedai-mods.xml
-        mods_path = os.path.join(output_dir, "EPUB", "zedai-mods.xml")
-        if os.path.exists(mods_path):
-            epub_zip.write(mods_path, "EPUB/zedai-mods.xml")
-        else:
-            raise FileNotFoundError(f"zedai-mods.xml 파일을 찾을 수 없습니다: {mods_path}")
+        epub_zip.writestr("EPUB/zedai-mods.xml", mods_content)
         
         # 7. EPUB/dtbook-*.xhtml 파일들
+        # 장별 DEFLATE는 순차로 수행: zipfile에는 미리 압축한 데이터를 넣는 공개 API가 없고,
+        # 장 XHTML은 수십~수백 KB 수준이라 프로세스 풀 직렬화 비용이 압축 시간보다 큼
+        # 진행 메시지는 모아 두었다가 한 번에 출력 (장마다 print 호출 방지)
+        added_messages = []
         for xhtml_file in xhtml_files:
-            if os.path.exists(xhtml_file['filepath']):
-                # ZIP 내부 경로는 항상 forward slash 사용
-                zip_path = f"EPUB/{xhtml_file['filename']}"
-                epub_zip.write(xhtml_file['filepath'], zip_path)
-                print(f"XHTML 파일 추가: {zip_path}")
-            else:
-                raise FileNotFoundError(f"XHTML 파일을 찾을 수 없습니다: {xhtml_file['filepath']}")
+            # ZIP 내부 경로는 항상 forward slash 사용
+            zip_path = f"EPUB/{xhtml_file['filename']}"
+            epub_zip.writestr(zip_path, xhtml_file['content'])
+            added_messages.append(f"XHTML 파일 추가: {zip_path}")
+        print("\n".join(added_messages))
         
-        # 8. EPUB/ 이미지 파일들 (images 폴더 없이 직접)
+        # 8. EPUB/ 이미지 파일들 (images 폴더 없이 직접, DAISY 원본에서 바로 추가)
         print(f"DAISY 디렉토리에서 이미지 파일 ZIP 추가 확인: {daisy_dir}")
         
-        if os.path.exists(daisy_dir):
-            all_files = os.listdir(daisy_dir)
-            image_files = [f for f in all_files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.svg'))]
-            print(f"발견된 이미지 파일들: {image_files}")
-            
-            for image_file in image_files:
-                # EPUB 폴더에 복사된 이미지 파일 경로
-                src_path = os.path.join(output_dir, "EPUB", image_file)
-                if os.path.exists(src_path):
-                    # ZIP 내부 경로는 항상 forward slash 사용 (EPUB 표준)
-                    zip_path = f"EPUB/{image_file}"
-                    epub_zip.write(src_path, zip_path)
-                    print(f"✅ EPUB Core Media Type 이미지 ZIP 추가: {zip_path}")
-                else:
-                    print(f"❌ 경고: 이미지 파일을 찾을 수 없습니다: {src_path}")
-        else:
-            print(f"❌ DAISY 디렉토리가 존재하지 않습니다: {daisy_dir}")
+        # 이미지 복사 버퍼는 하나만 할당하여 모든 이미지에 재사용
+        copy_view = memoryview(bytearray(IO_BUFSIZE))
+        
+        # image_entries는 scandir 결과이므로 파일마다 exists로 다시 stat하지 않고,
+        # 그 사이 사라진 파일만 예외로 처리
+        for image_file, _, src_path in image_entries:
+            # ZIP 내부 경로는 항상 forward slash 사용 (EPUB 표준)
+            zip_path = f"EPUB/{image_file}"
+            # JPEG/PNG/GIF는 이미 압축된 형식이므로 재압축하지 않고 저장
+            ext = os.path.splitext(image_file)[1].lower()
+            compress_type = zipfile.ZIP_STORED if ext in PRECOMPRESSED_EXTENSIONS else None
+            try:
+                stream_file_to_zip(epub_zip, src_path, zip_path, compress_type, copy_view)
+            except FileNotFoundError:
+                print(f"❌ 경고: 이미지 파일을 찾을 수 없습니다: {src_path}")
+                continue
+            print(f"✅ EPUB Core Media Type 이미지 ZIP 추가: {zip_path}")
     
     print(f"EPUB3 ZIP 파일 생성 완료: {epub_filename}")
     
@@ -369,55 +458,132 @@ def create_epub3_from_daisy(daisy_dir, output_dir, book_title=None, book_author=
     
     return epub_filename
 
-def create_title_page_xhtml(book_title, book_author, book_publisher, book_language):
-    """Title Page XHTML을 생성합니다."""
-    
-    title_xhtml = f'''<?xml version="1.0" encoding="utf-8"?>
-<!DOCTYPE html>
-<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="{book_language}" lang="{book_language}">
+def write_utf8_file(path, text):
+    """문자열을 한 번에 UTF-8로 인코딩하여 바이너리 파일로 씁니다.
 
-<head>
-  <meta charset="UTF-8" />
-  <title>{html.escape(book_title)}</title>
-  <link rel="stylesheet" type="text/css" href="zedai-css.css" />
-</head>
-
-<body xmlns:epub="http://www.idpf.org/2007/ops" epub:type="frontmatter">
-  <section epub:type="titlepage">
-    <h1 class="book-title">{html.escape(book_title)}</h1>
-    <p class="book-author">{html.escape(book_author)}</p>
-    <p class="book-publisher">{html.escape(book_publisher)}</p>
-  </section>
-</body>
+    텍스트 I/O 계층의 조각별 인코딩/개행 변환 없이 1 MiB 버퍼로 한 번에 기록합니다.
+    """
+    data = text.encode('utf-8')
+    with open(path, 'wb', buffering=IO_BUFSIZE) as f:
+        f.write(data)
+
+def make_safe_filename(title, max_length=50):
+    """책 제목을 모든 플랫폼에서 쓸 수 있는 파일명(확장자 제외)으로 바꿉니다."""
+    safe_title = UNSAFE_FILENAME_PATTERN.sub('_', title).strip()
+    safe_title = WHITESPACE_RUN_PATTERN.sub('_', safe_title)  # 공백을 언더스코어로 변경
+    # 파일명 길이 제한, Windows는 끝의 마침표를 허용하지 않음
+    safe_title = safe_title[:max_length].rstrip('.')
+    return safe_title or "untitled"
 
-</html>'''
-    
-    return title_xhtml
+def create_title_page_xhtml(book_title, book_author, book_publisher, book_language):
+    """Title Page XHTML을 생성합니다.
 
-def find_element_by_smil_id(bodymatter, smil_id, dtbook_ns):
-    """SMIL ID를 기반으로 DTBook 요소를 찾습니다."""
-    # smil_id에서 실제 DTBook ID 추출 (예: smil_par_p_160 -> p_160)
+    제목/저자/출판사는 사용자 입력 메타데이터이므로 lxml 트리로 만들어
+    이스케이프와 직렬화를 libxml2(C)에서 한 번에 처리합니다.
+    """
+    E = ElementMaker(namespace=XHTML_NS, nsmap={None: XHTML_NS, 'epub': OPS_NS})
+    epub_type = f"{{{OPS_NS}}}type"
+    
+    page = E.html(
+        {XML_LANG_ATTR: book_language, 'lang': book_language},
+        E.head(
+            E.meta(charset="UTF-8"),
+            E.title(book_title),
+            E.link(rel="stylesheet", type="text/css", href="zedai-css.css"),
+        ),
+        E.body(
+            {epub_type: "frontmatter"},
+            E.section(
+                {epub_type: "titlepage"},
+                E.h1(book_title, {'class': "book-title"}),
+                E.p(book_author, {'class': "book-author"}),
+                E.p(book_publisher, {'class': "book-publisher"}),
+            ),
+        ),
+    )
+    
+    return etree.tostring(page, pretty_print=True, xml_declaration=True,
+                          encoding='utf-8', doctype='<!DOCTYPE html>').decode('utf-8')
+
+def dtbook_id_from_content_src(content_src):
+    """NCX content src(예: dtbook.smil#smil_par_p_160)에서 DTBook ID(p_160)를 추출합니다.
+
+    '#'가 없으면 빈 문자열을 돌려줍니다.
+    """
+    _, sep, smil_id = content_src.rpartition('#')
+    if not sep:
+        return ''
     if smil_id.startswith('smil_par_'):
-        dtbook_id = smil_id.replace('smil_par_', '')
-    else:
-        dtbook_id = smil_id
-    
-    # bodymatter에서 해당 ID를 가진 요소 찾기
-    for elem in bodymatter.iter():
-        if elem.get('id') == dtbook_id:
-            return elem
-    
-    # ID를 찾을 수 없는 경우, level1 요소들 중에서 찾기
-    level1_elements = bodymatter.findall(f"{{{dtbook_ns}}}level1")
-    for level1 in level1_elements:
-        if level1.get('id') == dtbook_id:
-            return level1
-    
-    return None
+        return smil_id.replace('smil_par_', '')
+    return smil_id
+
+def release_level1(elem):
+    """변환이 끝난 bodymatter level1과 그 앞 형제들을 해제합니다.
+
+    앞 형제 중 pending_level1에 보관된 level1은 파이썬 참조가 남아 있으므로 트리에서만 떨어지고 유지됩니다.
+    """
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+def find_level1_by_dtbook_id(dtbook_events, pending_level1, level1_refs, dtbook_id, dtbook_ns, dtbook_file, fallback_state):
+    """DTBook ID에 해당하는 요소를 찾아 (요소, 스트리밍 트리에서 찾았는지 여부)로 돌려줍니다.
+
+    NCX 순서와 문서 순서가 같으면 bodymatter의 level1을 하나씩 읽어 바로 돌려주고,
+    먼저 읽힌 level1은 level1_refs에 참조가 남아 있을 때만 pending_level1에 보관하고 나머지는 바로 해제합니다.
+    bodymatter의 level1이 아닌 요소(또는 이미 해제된 요소)를 가리키면
+    DTBook 전체를 한 번 파싱해 만든 id 색인(fallback_state)에서 찾습니다.
+    """
+    elem = pending_level1.get(dtbook_id)
+    if elem is not None:
+        return elem, True
+    
+    level1_tag = f"{{{dtbook_ns}}}level1"
+    bodymatter_tag = f"{{{dtbook_ns}}}bodymatter"
+    for _, elem in dtbook_events:
+        parent = elem.getparent()
+        if elem.tag != level1_tag or parent is None or parent.tag != bodymatter_tag:
+            continue
+        elem_id = elem.get('id')
+        if elem_id == dtbook_id:
+            return elem, True
+        if level1_refs.get(elem_id) and elem_id not in pending_level1:
+            pending_level1[elem_id] = elem
+        else:
+            release_level1(elem)
+    
+    # level1이 아닌 요소를 가리키는 경우: 전체 트리를 한 번만 파싱하여 bodymatter id 색인 생성
+    if 'id_index' not in fallback_state:
+        id_index = {}
+        book = etree.parse(dtbook_file).getroot().find(f"{{{dtbook_ns}}}book")
+        bodymatter = book.find(bodymatter_tag) if book is not None else None
+        if bodymatter is not None:
+            # 같은 id가 여러 번 나오면 문서 순서상 첫 요소를 유지
+            for elem in bodymatter.iter(etree.Element):
+                elem_id = elem.get('id')
+                if elem_id is not None and elem_id not in id_index:
+                    id_index[elem_id] = elem
+        fallback_state['id_index'] = id_index
+    
+    return fallback_state['id_index'].get(dtbook_id), False
 
 def extract_text_content(element, dtbook_ns):
     """DTBook 요소에서 모든 텍스트 내용을 추출합니다."""
+    # sent/w만 포함하는 단순 요소는 lxml의 C 수준 itertext로 한 번에 추출 (성능 최적화)
+    # 표 셀/단락 대부분이 이 경로를 타므로 별도 직렬화 버퍼 없이 텍스트 노드만 모읍니다.
+    # 아래 재귀 경로와 같은 결과가 되도록 텍스트 노드마다 양끝 공백을 지우고 빈 노드는 빼서 공백 하나로 잇습니다.
+    inline_tags = (f"{{{dtbook_ns}}}sent", f"{{{dtbook_ns}}}w")
+    if all(desc.tag in inline_tags for desc in element.iterdescendants()):
+        return ' '.join(filter(None, [text.strip() for text in element.itertext()]))
+
     text_parts = []
+    # 정규화된 태그 이름과 정확히 비교 (endswith('p')는 imggroup/sup 등과도 일치하므로 사용하지 않음)
+    pagenum_tag = f"{{{dtbook_ns}}}pagenum"
+    text_tags = (f"{{{dtbook_ns}}}p",) + inline_tags
+    br_tag = f"{{{dtbook_ns}}}br"
+    imggroup_tag = f"{{{dtbook_ns}}}imggroup"
     
     # 요소 자체의 텍스트
     if element.text:
@@ -425,23 +591,21 @@ def extract_text_content(element, dtbook_ns):
     
     # 하위 요소들의 텍스트 재귀적으로 추출
     for child in element:
-        if child.tag.endswith('pagenum'):
+        tag = child.tag
+        if tag == pagenum_tag:
             # 페이지 번호는 텍스트 추출에서만 건너뛰기 (별도 처리됨)
             continue
-        elif child.tag.endswith(('p', 'sent', 'w')):
-            # 텍스트 요소들
-            if child.text:
-                text_parts.append(child.text.strip())
-            # 하위 요소도 재귀적으로 처리
+        elif tag in text_tags:
+            # 텍스트 요소들 (child.text는 재귀 호출에서 함께 추출되므로 따로 넣지 않음)
             child_text = extract_text_content(child, dtbook_ns)
             if child_text:
                 text_parts.append(child_text)
-        elif child.tag.endswith('br'):
+        elif tag == br_tag:
             # 줄바꿈
             text_parts.append(' ')
-        elif child.tag.endswith('imggroup'):
+        elif tag == imggroup_tag:
             # imggroup은 텍스트 추출에서 건너뛰기 (별도 이미지 처리됨)
-            print(f"🖼️ extract_text_content에서 imggroup 건너뛰기: {child.get('id', 'no-id')}")
+            logger.debug("🖼️ extract_text_content에서 imggroup 건너뛰기: %s", child.get('id', 'no-id'))
             continue
         else:
             # 기타 요소들도 재귀적으로 처리 (pagenum, imggroup 제외)
@@ -463,49 +627,58 @@ def render_dtbook_table_recursive(table_elem, dtbook_ns, file_index=0):
     - 셀 내부에서 <p>와 중첩 <table>을 원본 순서대로 처리
     - rowspan/colspan 유지
     """
-    content = ""
+    parts = []
+    p_tag = f"{{{dtbook_ns}}}p"
+    table_tag = f"{{{dtbook_ns}}}table"
+    caption_tag = f"{{{dtbook_ns}}}caption"
+    tbody_tag = f"{{{dtbook_ns}}}tbody"
+    tr_tag = f"{{{dtbook_ns}}}tr"
+    th_tag = f"{{{dtbook_ns}}}th"
+    td_tag = f"{{{dtbook_ns}}}td"
 
     table_id = table_elem.get('id', f'table_f{file_index}_auto')
-    content += f"""
-      <table id="{table_id}">"""
+    parts.append(f"""
+      <table id="{table_id}">""")
 
-    caption_elem = table_elem.find(f"{{{dtbook_ns}}}caption")
+    caption_elem = table_elem.find(caption_tag)
     if caption_elem is not None:
         caption_text = extract_text_content(caption_elem, dtbook_ns)
         if caption_text:
-            content += f"""
-        <caption>{html.escape(caption_text)}</caption>"""
+            parts.append(f"""
+        <caption>{escape_text(caption_text)}</caption>""")
 
-    tbody = table_elem.find(f"{{{dtbook_ns}}}tbody")
+    tbody = table_elem.find(tbody_tag)
     if tbody is not None:
         tbody_id = tbody.get('id', f'tbody_f{file_index}_auto')
-        content += f"""
-        <tbody id="{tbody_id}">"""
+        parts.append(f"""
+        <tbody id="{tbody_id}">""")
 
-        for row_idx, tr in enumerate(tbody.findall(f"{{{dtbook_ns}}}tr")):
+        for row_idx, tr in enumerate(tbody.iterchildren(tr_tag)):
             tr_id = tr.get('id', f'tr_f{file_index}_{row_idx}')
-            content += f"""
-          <tr id="{tr_id}">"""
+            parts.append(f"""
+          <tr id="{tr_id}">""")
 
             for cell_idx, cell in enumerate(tr):
-                if not cell.tag.endswith(('th', 'td')):
+                is_th = cell.tag == th_tag
+                if not is_th and cell.tag != td_tag:
                     continue
 
                 cell_id = cell.get('id', f'cell_f{file_index}_{row_idx}_{cell_idx}')
 
                 # 셀 내용: 자식 요소 순서 보존 (p와 table 모두 처리)
-                cell_inner = ""
-                for sub in list(cell):
-                    tag_ends = sub.tag.split('}')[-1] if '}' in sub.tag else sub.tag
-                    if tag_ends == 'p':
+                cell_parts = []
+                for sub in cell:
+                    if sub.tag == p_tag:
                         p_id = sub.get('id', f'table_{table_id}_cell_{row_idx}_{cell_idx}')
                         p_text = extract_text_content(sub, dtbook_ns)
-                        cell_inner += f"""
-                <p id="{p_id}">{html.escape(p_text)}</p>"""
-                    elif tag_ends == 'table':
+                        cell_parts.append(f"""
+                <p id="{p_id}">{escape_text(p_text)}</p>""")
+                    elif sub.tag == table_tag:
                         # 내부표 재귀 렌더링
                         nested_html = render_dtbook_table_recursive(sub, dtbook_ns, file_index)
-                        cell_inner += nested_html
+                        cell_parts.append(nested_html)
+
+                cell_inner = "".join(cell_parts)
 
                 # 비어있으면 셀 자체 텍스트 사용
                 if not cell_inner:
@@ -513,33 +686,36 @@ def render_dtbook_table_recursive(table_elem, dtbook_ns, file_index=0):
                     if cell_text:
                         p_id = f'table_{table_id}_cell_{row_idx}_{cell_idx}'
                         cell_inner = f"""
-                <p id="{p_id}">{html.escape(cell_text)}</p>"""
-
-                attrs = ''
-                if cell.get('rowspan'):
-                    attrs += f" rowspan=\"{cell.get('rowspan')}\""
-                if cell.get('colspan'):
-                    attrs += f" colspan=\"{cell.get('colspan')}\""
-
-                if cell.tag.endswith('th'):
+                <p id="{p_id}">{escape_text(cell_text)}</p>"""
+
+                rowspan = cell.get('rowspan')
+                colspan = cell.get('colspan')
+                attr_parts = []
+                if rowspan:
+                    attr_parts.append(f' rowspan="{rowspan}"')
+                if colspan:
+                    attr_parts.append(f' colspan="{colspan}"')
+                attrs = "".join(attr_parts)
+
+                if is_th:
                     scope = 'row' if cell_idx == 0 else 'col'
-                    content += f"""
+                    parts.append(f"""
             <th id="{cell_id}" scope="{scope}"{attrs}>{cell_inner}
-            </th>"""
+            </th>""")
                 else:
-                    content += f"""
+                    parts.append(f"""
             <td id="{cell_id}"{attrs}>{cell_inner}
-            </td>"""
+            </td>""")
 
-            content += """
-          </tr>"""
+            parts.append("""
+          </tr>""")
 
-        content += """
-        </tbody>"""
+        parts.append("""
+        </tbody>""")
 
-    content += """
-      </table>"""
-    return content
+    parts.append("""
+      </table>""")
+    return "".join(parts)
 
 def create_xhtml_from_nav_structure(target_element, file_index, title, dtbook_ns, book_title, book_language="ko"):
     """DTBook level 구조를 기반으로 XHTML를 생성합니다."""
@@ -547,18 +723,18 @@ def create_xhtml_from_nav_structure(target_element, file_index, title, dtbook_ns
     # 고유 ID 생성용 카운터
     id_counter = 0
     
-    # XHTML 시작
-    xhtml = f'''<?xml version="1.0" encoding="utf-8"?>
+    # XHTML 시작 (문자열 += 대신 리스트에 모아 마지막에 한 번만 join)
+    parts = [f'''<?xml version="1.0" encoding="utf-8"?>
 <!DOCTYPE html>
 <html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="{book_language}" lang="{book_language}">
 
 <head>
   <meta charset="UTF-8" />
-  <title>{html.escape(book_title)}</title>
+  <title>{escape_cached(book_title)}</title>
   <link rel="stylesheet" type="text/css" href="zedai-css.css" />
 </head>
 
-<body xmlns:epub="http://www.idpf.org/2007/ops" epub:type="bodymatter">'''
+<body xmlns:epub="http://www.idpf.org/2007/ops" epub:type="bodymatter">''']
     
     # level1 섹션 시작 (파일별 고유 ID)
     section_id = target_element.get('id', f'section_f{file_index}_p1')
@@ -567,84 +743,63 @@ def create_xhtml_from_nav_structure(target_element, file_index, title, dtbook_ns
     
     # 원본 DAISY에서 헤딩 레벨 찾기
     heading_tag = "h1"  # 기본값
+    tag_kinds = _dtbook_tag_kinds(dtbook_ns)
     for child in target_element:
-        if child.tag.endswith(('h1', 'h2', 'h3', 'h4', 'h5', 'h6')):
+        if tag_kinds.get(child.tag) == 'heading':
             heading_tag = child.tag.split('}')[-1] if '}' in child.tag else child.tag
             break
     
-    xhtml += f'''
+    parts.append(f'''
   <section id="{section_id}">
-    <{heading_tag} id="{main_heading_id}">{html.escape(title)}</{heading_tag}>'''
+    <{heading_tag} id="{main_heading_id}">{escape_text(title)}</{heading_tag}>''')
     
     # target_element의 내용을 계층적으로 처리 (NCX가 아닌 실제 DTBook 구조 사용)
-    xhtml += process_dtbook_level_content(target_element, dtbook_ns, file_index, 1, skip_main_heading=True)
+    parts.append(process_dtbook_level_content(target_element, dtbook_ns, file_index, 1, skip_main_heading=True))
     
     # level1 섹션 종료
-    xhtml += '''
+    parts.append('''
   </section>
 </body>
 
-</html>'''
+</html>''')
     
-    return xhtml
+    return "".join(parts)
 
 def process_dtbook_level_content(element, dtbook_ns, file_index=0, level=1, skip_main_heading=True):
-    """DTBook level 요소를 계층적으로 처리하여 XHTML로 변환합니다."""
-    content = ""
+    """DTBook level 요소를 계층적으로 처리하여 XHTML로 변환합니다.
+
+    XSLT 한 번으로 바꾸지 않고 요소별로 직접 분기하는 이유: 출력 id가 파일 번호와
+    처리 순서 카운터(element_counter)로 만들어지고, figure/pagebreak/표 구조를
+    DAISY Pipeline 출력 형식에 맞춰야 하기 때문입니다. 분기는 _dtbook_tag_kinds의
+    dict 조회 한 번으로 이루어집니다.
+    """
+    parts = []
     element_counter = 0
+    tag_kinds = _dtbook_tag_kinds(dtbook_ns)
+    img_tag = f"{{{dtbook_ns}}}img"
+    caption_tag = f"{{{dtbook_ns}}}caption"
+    p_tag = f"{{{dtbook_ns}}}p"
+    table_tag = f"{{{dtbook_ns}}}table"
+    tbody_tag = f"{{{dtbook_ns}}}tbody"
+    tr_tag = f"{{{dtbook_ns}}}tr"
+    th_tag = f"{{{dtbook_ns}}}th"
+    td_tag = f"{{{dtbook_ns}}}td"
     
     for child in element:
-        print(f"🔍 처리 중인 요소: {child.tag}, id: {child.get('id', 'no-id')}")
+        logger.debug("🔍 처리 중인 요소: %s, id: %s", child.tag, child.get('id', 'no-id'))
+        kind = tag_kinds.get(child.tag)
         
-        # imggroup 특별 체크
-        if 'imggroup' in child.tag:
-            print(f"🚨 IMGGROUP 태그 발견됨! 전체 태그: {child.tag}")
-        
-        if child.tag.endswith('imggroup'):
+        if kind == 'imggroup':
             # 이미지 그룹 처리 - 최우선으로 처리
-            print(f"🖼️ IMGGROUP 발견! id: {child.get('id', 'no-id')}")
-            print(f"    imggroup 내부 요소들: {[elem.tag for elem in child]}")
+            logger.debug("🖼️ IMGGROUP 발견! id: %s", child.get('id', 'no-id'))
             
-            # 더 강화된 img 요소 찾기
+            # img는 imggroup의 직계 자식이므로 한 번의 순회로 찾기
             img_elem = None
-            
-            # 1. 네임스페이스 포함해서 img 요소 찾기
-            img_elem = child.find(f"{{{dtbook_ns}}}img")
-            print(f"    네임스페이스 포함 img 요소 찾기 결과: {img_elem is not None}")
-            
-            # 2. 네임스페이스 없이도 시도해보기
-            if img_elem is None:
-                img_elem = child.find("img")
-                print(f"    네임스페이스 없이 img 요소 찾기 결과: {img_elem is not None}")
-            
-            # 3. 모든 하위 요소 중에서 tag가 img로 끝나는 것 찾기
-            if img_elem is None:
-                for elem in child:
-                    print(f"      검사 중인 하위 요소: {elem.tag}")
-                    if elem.tag.endswith('img'):
-                        img_elem = elem
-                        print(f"    tag 끝검사로 img 요소 발견: {elem.tag}")
-                        break
-            
-            # 4. XPath로도 시도해보기
-            if img_elem is None:
-                try:
-                    img_elems = child.xpath('.//img')
-                    if img_elems:
-                        img_elem = img_elems[0]
-                        print(f"    XPath로 img 요소 발견: {img_elem.tag}")
-                except Exception as e:
-                    print(f"    XPath 검색 실패: {e}")
-            
-            # 5. 네임스페이스를 직접 확인해서 찾기
-            if img_elem is None:
-                for elem in child:
-                    if 'img' in elem.tag:
-                        img_elem = elem
-                        print(f"    네임스페이스 직접 확인으로 img 요소 발견: {elem.tag}")
-                        break
-            
-            print(f"    최종 img 요소 발견 여부: {img_elem is not None}")
+            for sub in child:
+                if sub.tag == img_tag or (isinstance(sub.tag, str) and sub.tag.rsplit('}', 1)[-1] == 'img'):
+                    img_elem = sub
+                    break
+            logger.debug("    img 요소 발견 여부: %s", img_elem is not None)
             
             if img_elem is not None:
                 img_src = img_elem.get('src', '')
@@ -654,80 +809,63 @@ def process_dtbook_level_content(element, dtbook_ns, file_index=0, level=1, skip
                 
                 # 이미지 파일명 추출
                 img_filename = os.path.basename(img_src)
-                print(f"🖼️ 이미지 처리 (process_dtbook_level_content): src='{img_src}' -> filename='{img_filename}'")
+                logger.debug("🖼️ 이미지 처리 (process_dtbook_level_content): src='%s' -> filename='%s'", img_src, img_filename)
                 
                 # 캡션 요소 찾기
-                caption_elem = child.find(f"{{{dtbook_ns}}}caption")
+                caption_elem = child.find(caption_tag)
                 caption_text = img_alt  # 기본값
                 
                 if caption_elem is not None:
-                    # 캡션 내부의 모든 텍스트 추출
-                    caption_parts = []
-                    if caption_elem.text:
-                        caption_parts.append(caption_elem.text.strip())
-                    
-                    for sent in caption_elem.findall(f"{{{dtbook_ns}}}sent"):
-                        if sent.text:
-                            caption_parts.append(sent.text.strip())
-                        for w in sent.findall(f"{{{dtbook_ns}}}w"):
-                            if w.text:
-                                caption_parts.append(w.text.strip())
-                    
-                    if caption_parts:
-                        caption_text = " ".join(caption_parts)
+                    # 캡션 내부의 모든 텍스트 노드를 양끝 공백 제거 후 공백 하나로 결합
+                    # (sent/w 사이 공백이 들여쓰기 tail에만 있으므로 DTBook 들여쓰기 여부와 무관하게 구분)
+                    caption_text = ' '.join(filter(None, [text.strip() for text in caption_elem.itertext()])) or img_alt
                 
-                print(f"    📝 EPUB 3.0 표준 이미지 생성: <img src=\"{img_filename}\" alt=\"{img_alt}\" />")
+                logger.debug("    📝 EPUB 3.0 표준 이미지 생성: <img src=\"%s\" alt=\"%s\" />", img_filename, img_alt)
                 
                 # EPUB 3.0 표준 figure 구조
-                content += f'''
+                parts.append(f'''
       <figure id="{img_id}">
-        <img src="{img_filename}" alt="{html.escape(img_alt)}" />'''
+        <img src="{img_filename}" alt="{escape_cached(img_alt)}" />''')
                 
                 # 캡션이 있는 경우에만 figcaption 추가
                 if caption_text and caption_text.strip() and caption_text != img_alt:
-                    content += f'''
+                    parts.append(f'''
         <figcaption id="caption_f{file_index}_{element_counter}">
-          {html.escape(caption_text)}
-        </figcaption>'''
+          {escape_text(caption_text)}
+        </figcaption>''')
                 
-                content += '''
-      </figure>'''
+                parts.append('''
+      </figure>''')
             else:
                 # img 요소를 찾지 못한 경우에도 빈 p 태그를 만들지 않음
-                print(f"    ❌ img 요소를 찾지 못했습니다. imggroup 건너뛰기: id={child.get('id', 'no-id')}")
+                logger.debug("    ❌ img 요소를 찾지 못했습니다. imggroup 건너뛰기: id=%s", child.get('id', 'no-id'))
                 # imggroup이 제대로 처리되지 않았지만 빈 태그로 변환하지 않음
                 
-        elif child.tag.endswith(('h1', 'h2', 'h3', 'h4', 'h5', 'h6')) and skip_main_heading:
+        elif kind == 'heading' and skip_main_heading:
             # 메인 헤딩은 이미 처리했으므로 건너뛰기
             continue
-        elif child.tag.endswith('pagenum'):
+        elif kind == 'pagenum':
             # DAISY Pipeline 방식의 페이지 번호 처리
             page_num = child.text.strip() if child.text else ""
             page_id = child.get('id', f'pagebreak_f{file_index}_{element_counter}')
             element_counter += 1
             
             # DAISY Pipeline과 동일한 형식
-            content += f'''<span aria-label=" {page_num}. " role="doc-pagebreak" epub:type="pagebreak" id="{page_id}"></span>'''
+            parts.append(f'''<span aria-label=" {page_num}. " role="doc-pagebreak" epub:type="pagebreak" id="{page_id}"></span>''')
             
-        elif child.tag.endswith('p'):
-            # imggroup이 잘못 p로 처리되지 않도록 확인
-            if 'imggroup' in child.tag:
-                print(f"⚠️ imggroup이 p 태그로 잘못 처리되려 했습니다: {child.tag}, id: {child.get('id', 'no-id')}")
-                # imggroup을 p 태그로 처리하지 않고 건너뛰기
-                continue
-                
+        elif kind == 'p':
             # 단락 처리
             p_id = child.get('id', f'para_f{file_index}_{element_counter}')
             p_text = extract_text_content(child, dtbook_ns)
             element_counter += 1
             
             # 일반 단락
-            content += f'''
-      <p id="{p_id}">{html.escape(p_text)}</p>'''
+            parts.append(f'''
+      <p id="{p_id}">{escape_text(p_text)}</p>''')
             
-        elif child.tag.endswith(('level2', 'level3', 'level4', 'level5', 'level6')):
+        elif kind == 'level':
             # 하위 레벨 처리
-            level_num = int(child.tag[-1]) if child.tag[-1].isdigit() else level + 1
+            level_num = int(child.tag[-1])
             level_id = child.get('id', f'level{level_num}_f{file_index}_{element_counter}')
             element_counter += 1
             
@@ -737,73 +875,75 @@ def process_dtbook_level_content(element, dtbook_ns, file_index=0, level=1, skip
             heading_tag = f"h{level_num}"
             
             for subchild in child:
-                if subchild.tag.endswith(('h1', 'h2', 'h3', 'h4', 'h5', 'h6')):
+                if tag_kinds.get(subchild.tag) == 'heading':
                     heading_elem = subchild
                     heading_text = subchild.text if subchild.text else f"Section {level_num}"
                     heading_tag = subchild.tag.split('}')[-1] if '}' in subchild.tag else subchild.tag
                     break
             
             # 하위 레벨 섹션 시작
-            content += f'''
+            parts.append(f'''
     <section id="{level_id}">
-      <{heading_tag} id="heading_f{file_index}_{element_counter}">{html.escape(heading_text)}</{heading_tag}>'''
+      <{heading_tag} id="heading_f{file_index}_{element_counter}">{escape_text(heading_text)}</{heading_tag}>''')
             element_counter += 1
             
             # 하위 레벨 내용 재귀 처리 (하위 레벨에서는 헤딩을 포함)
             subcontent = process_dtbook_level_content(child, dtbook_ns, file_index, level_num, skip_main_heading=False)
-            content += subcontent
+            parts.append(subcontent)
             
             # 하위 레벨 섹션 종료
-            content += '''
-    </section>'''
+            parts.append('''
+    </section>''')
                 
-        elif child.tag.endswith('table'):
+        elif kind == 'table':
             # DAISY Pipeline 방식의 표 처리
             table_id = child.get('id', f'table_f{file_index}_{element_counter}')
             element_counter += 1
             
-            content += f'''
-      <table id="{table_id}">'''
+            parts.append(f'''
+      <table id="{table_id}">''')
             
             # 표 캡션 처리
-            caption_elem = child.find(f"{{{dtbook_ns}}}caption")
+            caption_elem = child.find(caption_tag)
             if caption_elem is not None:
                 caption_text = extract_text_content(caption_elem, dtbook_ns)
                 if caption_text:
-                    content += f'''
-        <caption>{html.escape(caption_text)}</caption>'''
+                    parts.append(f'''
+        <caption>{escape_text(caption_text)}</caption>''')
             
             # tbody 처리 (DAISY Pipeline은 항상 tbody 사용)
-            tbody = child.find(f"{{{dtbook_ns}}}tbody")
+            tbody = child.find(tbody_tag)
             if tbody is not None:
                 tbody_id = tbody.get('id', f'tbody_f{file_index}_{element_counter}')
-                content += f'''
-        <tbody id="{tbody_id}">'''
+                parts.append(f'''
+        <tbody id="{tbody_id}">''')
                 
                 cell_id_counter = 1
-                for row_idx, tr in enumerate(tbody.findall(f"{{{dtbook_ns}}}tr")):
+                for row_idx, tr in enumerate(tbody.iterchildren(tr_tag)):
                     tr_id = tr.get('id', f'tr_f{file_index}_{row_idx}')
-                    content += f'''
-          <tr id="{tr_id}">'''
+                    parts.append(f'''
+          <tr id="{tr_id}">''')
                     
                     # DAISY Pipeline 방식: th와 td를 순서대로 처리
                     for cell_idx, cell in enumerate(tr):
-                        if cell.tag.endswith(('th', 'td')):
+                        is_th = cell.tag == th_tag
+                        if is_th or cell.tag == td_tag:
                             cell_id = cell.get('id', f'id_{cell_id_counter}')
                             cell_id_counter += 1
                             
                             # 셀 내용 추출: p와 table을 원본 순서대로 처리
-                            cell_content = ""
-                            for sub in list(cell):
-                                tag_ends = sub.tag.split('}')[-1] if '}' in sub.tag else sub.tag
-                                if tag_ends == 'p':
+                            cell_parts = []
+                            for sub in cell:
+                                if sub.tag == p_tag:
                                     p_id = sub.get('id', f'table_{table_id}_cell_{row_idx}_{cell_idx}')
                                     p_text = extract_text_content(sub, dtbook_ns)
-                                    cell_content += f'''
-                <p id="{p_id}">{html.escape(p_text)}</p>'''
-                                elif tag_ends == 'table':
+                                    cell_parts.append(f'''
+                <p id="{p_id}">{escape_text(p_text)}</p>''')
+                                elif sub.tag == table_tag:
                                     nested_html = render_dtbook_table_recursive(sub, dtbook_ns, file_index)
-                                    cell_content += nested_html
+                                    cell_parts.append(nested_html)
+                            
+                            cell_content = "".join(cell_parts)
                             
                             # 셀 내용이 없으면 직접 텍스트 사용
                             if not cell_content:
@@ -811,46 +951,67 @@ def process_dtbook_level_content(element, dtbook_ns, file_index=0, level=1, skip
                                 if cell_text:
                                     p_id = f'table_{table_id}_cell_{row_idx}_{cell_idx}'
                                     cell_content = f'''
-                <p id="{p_id}">{html.escape(cell_text)}</p>'''
+                <p id="{p_id}">{escape_text(cell_text)}</p>'''
                             
                             # 셀 병합 속성 처리
-                            attrs = ''
-                            if cell.get('rowspan'):
-                                attrs += f' rowspan="{cell.get("rowspan")}"'
-                            if cell.get('colspan'):
-                                attrs += f' colspan="{cell.get("colspan")}"'
+                            rowspan = cell.get('rowspan')
+                            colspan = cell.get('colspan')
+                            attr_parts = []
+                            if rowspan:
+                                attr_parts.append(f' rowspan="{rowspan}"')
+                            if colspan:
+                                attr_parts.append(f' colspan="{colspan}"')
+                            attrs = "".join(attr_parts)
                             
                             # th 또는 td 생성 (DAISY Pipeline 방식)
-                            if cell.tag.endswith('th'):
+                            if is_th:
                                 # th에는 scope 속성 추가
                                 scope = 'row' if cell_idx == 0 else 'col'
-                                content += f'''
+                                parts.append(f'''
             <th id="{cell_id}" scope="{scope}"{attrs}>{cell_content}
-            </th>'''
+            </th>''')
                             else:
-                                content += f'''
+                                parts.append(f'''
             <td id="{cell_id}"{attrs}>{cell_content}
-            </td>'''
+            </td>''')
                     
-                    content += '''
-          </tr>'''
+                    parts.append('''
+          </tr>''')
                 
-                content += '''
-        </tbody>'''
+                parts.append('''
+        </tbody>''')
             
-            content += '''
-      </table>'''
-        else:
-            # 처리되지 않은 요소 로깅 및 빈 p 태그 방지
-            if child.tag.endswith('imggroup'):
-                # imggroup이 여기까지 왔다면 이미 위에서 처리되었거나 처리 실패
-                print(f"⚠️ IMGGROUP 재처리 방지: {child.tag}, id: {child.get('id', 'no-id')}")
-            else:
-                print(f"⚠️ 처리되지 않은 요소: {child.tag}, id: {child.get('id', 'no-id')}")
-                # 알 수 없는 요소를 빈 p 태그로 변환하는 로직 방지
-                # 원본 id를 유지한 빈 p 태그가 생성되지 않도록 함
+            parts.append('''
+      </table>''')
+        elif kind != 'heading':
+            # 처리되지 않은 요소는 로깅만 하고 빈 p 태그로 변환하지 않음
+            logger.debug("⚠️ 처리되지 않은 요소: %s, id: %s", child.tag, child.get('id', 'no-id'))
     
-    return content
+    return "".join(parts)
+
+# create_xhtml_from_level1 고정 머리말/꼬리말 (모듈 수준 상수)
+LEVEL1_XHTML_HEAD_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="{language}" lang="{language}">
+
+<head>
+  <meta charset="UTF-8" />
+  <title>{book_title}</title>
+  <link rel="stylesheet" type="text/css" href="zedai-css.css" />
+</head>
+
+<body xmlns:epub="http://www.idpf.org/2007/ops" epub:type="bodymatter">
+  <section id="section_f{file_index}_level1">
+    <{heading_tag} id="heading_f{file_index}_main">{title}</{heading_tag}>'''
+
+LEVEL1_XHTML_TAIL = '''
+  </section>
+</body>
+
+</html>'''
+
+# create_xhtml_from_level1에서 실제로 출력을 만드는 요소 종류
+LEVEL1_CONTENT_KINDS = frozenset(('imggroup', 'pagenum', 'p', 'table'))
 
 def create_xhtml_from_level1(level1, file_index, dtbook_ns, book_title, book_language="ko"):
     """level1 요소를 XHTML로 변환합니다."""
@@ -859,84 +1020,59 @@ def create_xhtml_from_level1(level1, file_index, dtbook_ns, book_title, book_lan
     heading_elem = None
     heading_tag = "h1"  # 기본값
     title = f"Section {file_index}"
+    tag_kinds = _dtbook_tag_kinds(dtbook_ns)
+    img_tag = f"{{{dtbook_ns}}}img"
+    caption_tag = f"{{{dtbook_ns}}}caption"
+    p_tag = f"{{{dtbook_ns}}}p"
+    table_tag = f"{{{dtbook_ns}}}table"
+    tbody_tag = f"{{{dtbook_ns}}}tbody"
+    tr_tag = f"{{{dtbook_ns}}}tr"
+    th_tag = f"{{{dtbook_ns}}}th"
+    td_tag = f"{{{dtbook_ns}}}td"
     
     for child in level1:
-        if child.tag.endswith(('h1', 'h2', 'h3', 'h4', 'h5', 'h6')):
+        if tag_kinds.get(child.tag) == 'heading':
             heading_elem = child
             heading_tag = child.tag.split('}')[-1] if '}' in child.tag else child.tag
             title = child.text if child.text else f"Section {file_index}"
             break
     
-    # XHTML 시작
-    xhtml = f'''<?xml version="1.0" encoding="utf-8"?>
-<!DOCTYPE html>
-<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="{book_language}" lang="{book_language}">
-
-<head>
-  <meta charset="UTF-8" />
-  <title>{html.escape(book_title)}</title>
-  <link rel="stylesheet" type="text/css" href="zedai-css.css" />
-</head>
-
-<body xmlns:epub="http://www.idpf.org/2007/ops" epub:type="bodymatter">
-  <section id="section_f{file_index}_level1">
-    <{heading_tag} id="heading_f{file_index}_main">{html.escape(title)}</{heading_tag}>'''
+    # XHTML 시작 (문자열 += 대신 리스트에 모아 마지막에 한 번만 join)
+    head = LEVEL1_XHTML_HEAD_TEMPLATE.format_map({
+        'language': book_language,
+        'book_title': escape_cached(book_title),
+        'file_index': file_index,
+        'heading_tag': heading_tag,
+        'title': escape_text(title),
+    })
+    
+    # 출력할 요소가 하나도 없는 level1은 순회 없이 빈 섹션으로 바로 반환
+    if not any(tag_kinds.get(elem.tag) in LEVEL1_CONTENT_KINDS for elem in level1 if elem is not heading_elem):
+        return head + LEVEL1_XHTML_TAIL
+    
+    parts = [head]
     
     # level1 내부의 모든 요소들을 순회
     element_counter = 0
     
     for elem in level1:
-        print(f"🔍 level1에서 처리 중인 요소: {elem.tag}, id: {elem.get('id', 'no-id')}")
-        
-        # imggroup 특별 체크 (level1 버전)
-        if 'imggroup' in elem.tag:
-            print(f"🚨 LEVEL1에서 IMGGROUP 태그 발견됨! 전체 태그: {elem.tag}")
+        # 메인 헤딩은 이미 처리했으므로 태그 비교 없이 동일 객체 여부로 건너뛰기
+        if elem is heading_elem:
+            continue
+        logger.debug("🔍 level1에서 처리 중인 요소: %s, id: %s", elem.tag, elem.get('id', 'no-id'))
+        kind = tag_kinds.get(elem.tag)
         
-        if elem.tag.endswith('imggroup'):
+        if kind == 'imggroup':
             # 이미지 그룹 처리 - 최우선으로 처리
-            print(f"🖼️ level1에서 IMGGROUP 발견! id: {elem.get('id', 'no-id')}")
-            print(f"    level1 imggroup 내부 요소들: {[e.tag for e in elem]}")
+            logger.debug("🖼️ level1에서 IMGGROUP 발견! id: %s", elem.get('id', 'no-id'))
             
-            # 더 강화된 img 요소 찾기
+            # img는 imggroup의 직계 자식이므로 한 번의 순회로 찾기
             img_elem = None
-            
-            # 1. 네임스페이스 포함해서 img 요소 찾기
-            img_elem = elem.find(f"{{{dtbook_ns}}}img")
-            print(f"    level1 네임스페이스 포함 img 요소 찾기 결과: {img_elem is not None}")
-            
-            # 2. 네임스페이스 없이도 시도해보기
-            if img_elem is None:
-                img_elem = elem.find("img")
-                print(f"    level1 네임스페이스 없이 img 요소 찾기 결과: {img_elem is not None}")
-            
-            # 3. 모든 하위 요소 중에서 tag가 img로 끝나는 것 찾기
-            if img_elem is None:
-                for e in elem:
-                    print(f"      level1 검사 중인 하위 요소: {e.tag}")
-                    if e.tag.endswith('img'):
-                        img_elem = e
-                        print(f"    level1 tag 끝검사로 img 요소 발견: {e.tag}")
-                        break
-            
-            # 4. XPath로도 시도해보기
-            if img_elem is None:
-                try:
-                    img_elems = elem.xpath('.//img')
-                    if img_elems:
-                        img_elem = img_elems[0]
-                        print(f"    level1 XPath로 img 요소 발견: {img_elem.tag}")
-                except Exception as e:
-                    print(f"    level1 XPath 검색 실패: {e}")
-            
-            # 5. 네임스페이스를 직접 확인해서 찾기
-            if img_elem is None:
-                for e in elem:
-                    if 'img' in e.tag:
-                        img_elem = e
-                        print(f"    level1 네임스페이스 직접 확인으로 img 요소 발견: {e.tag}")
-                        break
-            
-            print(f"    level1 최종 img 요소 발견 여부: {img_elem is not None}")
+            for sub in elem:
+                if sub.tag == img_tag or (isinstance(sub.tag, str) and sub.tag.rsplit('}', 1)[-1] == 'img'):
+                    img_elem = sub
+                    break
+            logger.debug("    level1 img 요소 발견 여부: %s", img_elem is not None)
             
             if img_elem is not None:
                 img_src = img_elem.get('src', '')
@@ -946,124 +1082,106 @@ def create_xhtml_from_level1(level1, file_index, dtbook_ns, book_title, book_lan
                 
                 # 이미지 파일명 추출
                 img_filename = os.path.basename(img_src)
-                print(f"🖼️ 이미지 처리 (create_xhtml_from_level1): src='{img_src}' -> filename='{img_filename}'")
+                logger.debug("🖼️ 이미지 처리 (create_xhtml_from_level1): src='%s' -> filename='%s'", img_src, img_filename)
                 
                 # 캡션 요소 찾기
-                caption_elem = elem.find(f"{{{dtbook_ns}}}caption")
+                caption_elem = elem.find(caption_tag)
                 caption_text = img_alt  # 기본값
                 
                 if caption_elem is not None:
-                    # 캡션 내부의 모든 텍스트 추출
-                    caption_parts = []
-                    if caption_elem.text:
-                        caption_parts.append(caption_elem.text.strip())
-                    
-                    for sent in caption_elem.findall(f"{{{dtbook_ns}}}sent"):
-                        if sent.text:
-                            caption_parts.append(sent.text.strip())
-                        for w in sent.findall(f"{{{dtbook_ns}}}w"):
-                            if w.text:
-                                caption_parts.append(w.text.strip())
-                    
-                    if caption_parts:
-                        caption_text = " ".join(caption_parts)
+                    # 캡션 내부의 모든 텍스트 노드를 양끝 공백 제거 후 공백 하나로 결합
+                    # (sent/w 사이 공백이 들여쓰기 tail에만 있으므로 DTBook 들여쓰기 여부와 무관하게 구분)
+                    caption_text = ' '.join(filter(None, [text.strip() for text in caption_elem.itertext()])) or img_alt
                 
-                print(f"    📝 level1 EPUB 3.0 표준 이미지 생성: <img src=\"{img_filename}\" alt=\"{img_alt}\" />")
+                logger.debug("    📝 level1 EPUB 3.0 표준 이미지 생성: <img src=\"%s\" alt=\"%s\" />", img_filename, img_alt)
                 
                 # EPUB 3.0 표준 figure 구조
-                xhtml += f'''
+                parts.append(f'''
     <figure id="{img_id}">
-      <img src="{img_filename}" alt="{html.escape(img_alt)}" />'''
+      <img src="{img_filename}" alt="{escape_cached(img_alt)}" />''')
                 
                 # 캡션이 있는 경우에만 figcaption 추가
                 if caption_text and caption_text.strip() and caption_text != img_alt:
-                    xhtml += f'''
+                    parts.append(f'''
       <figcaption id="caption_f{file_index}_{element_counter}">
-        {html.escape(caption_text)}
-      </figcaption>'''
+        {escape_text(caption_text)}
+      </figcaption>''')
                 
-                xhtml += '''
-    </figure>'''
+                parts.append('''
+    </figure>''')
             else:
                 # img 요소를 찾지 못한 경우에도 빈 p 태그를 만들지 않음
-                print(f"    ❌ level1 img 요소를 찾지 못했습니다. imggroup 건너뛰기: id={elem.get('id', 'no-id')}")
+                logger.debug("    ❌ level1 img 요소를 찾지 못했습니다. imggroup 건너뛰기: id=%s", elem.get('id', 'no-id'))
                 # imggroup이 제대로 처리되지 않았지만 빈 태그로 변환하지 않음
                 
-        elif elem.tag.endswith(('h1', 'h2', 'h3', 'h4', 'h5', 'h6')):
-            # 헤딩은 이미 처리했으므로 건너뛰기
-            continue
-        elif elem.tag.endswith('pagenum'):
+        elif kind == 'pagenum':
             # DAISY Pipeline 방식의 페이지 번호 처리
             page_num = elem.text.strip() if elem.text else ""
             page_id = elem.get('id', f'pagebreak_f{file_index}_{element_counter}')
             element_counter += 1
             
             # DAISY Pipeline과 동일한 형식
-            xhtml += f'''<span aria-label=" {page_num}. " role="doc-pagebreak" epub:type="pagebreak" id="{page_id}"></span>'''
-        elif elem.tag.endswith('p'):
-            # imggroup이 잘못 p로 처리되지 않도록 확인
-            if 'imggroup' in elem.tag:
-                print(f"⚠️ level1에서 imggroup이 p 태그로 잘못 처리되려 했습니다: {elem.tag}, id: {elem.get('id', 'no-id')}")
-                # imggroup을 p 태그로 처리하지 않고 건너뛰기
-                continue
-                
+            parts.append(f'''<span aria-label=" {page_num}. " role="doc-pagebreak" epub:type="pagebreak" id="{page_id}"></span>''')
+        elif kind == 'p':
             # 단락 처리
             p_id = elem.get('id', f'para_f{file_index}_{element_counter}')
             p_text = extract_text_content(elem, dtbook_ns)
             element_counter += 1
             
             # 일반 단락
-            xhtml += f'''
-    <p id="{p_id}">{html.escape(p_text)}</p>'''
+            parts.append(f'''
+    <p id="{p_id}">{escape_text(p_text)}</p>''')
                 
-        elif elem.tag.endswith('table'):
+        elif kind == 'table':
             # DAISY Pipeline 방식의 표 처리
             table_id = elem.get('id', f'table_f{file_index}_{element_counter}')
             element_counter += 1
             
-            xhtml += f'''
-    <table id="{table_id}">'''
+            parts.append(f'''
+    <table id="{table_id}">''')
             
             # 표 캡션 처리
-            caption_elem = elem.find(f"{{{dtbook_ns}}}caption")
+            caption_elem = elem.find(caption_tag)
             if caption_elem is not None:
                 caption_text = extract_text_content(caption_elem, dtbook_ns)
                 if caption_text:
-                    xhtml += f'''
-      <caption>{html.escape(caption_text)}</caption>'''
+                    parts.append(f'''
+      <caption>{escape_text(caption_text)}</caption>''')
             
             # tbody 처리 (DAISY Pipeline은 항상 tbody 사용)
-            tbody = elem.find(f"{{{dtbook_ns}}}tbody")
+            tbody = elem.find(tbody_tag)
             if tbody is not None:
                 tbody_id = tbody.get('id', f'tbody_f{file_index}_{element_counter}')
-                xhtml += f'''
-      <tbody id="{tbody_id}">'''
+                parts.append(f'''
+      <tbody id="{tbody_id}">''')
                 
                 cell_id_counter = 1
-                for row_idx, tr in enumerate(tbody.findall(f"{{{dtbook_ns}}}tr")):
+                for row_idx, tr in enumerate(tbody.iterchildren(tr_tag)):
                     tr_id = tr.get('id', f'tr_f{file_index}_{row_idx}')
-                    xhtml += f'''
-        <tr id="{tr_id}">'''
+                    parts.append(f'''
+        <tr id="{tr_id}">''')
                     
                     # DAISY Pipeline 방식: th와 td를 순서대로 처리
                     for cell_idx, cell in enumerate(tr):
-                        if cell.tag.endswith(('th', 'td')):
+                        is_th = cell.tag == th_tag
+                        if is_th or cell.tag == td_tag:
                             cell_id = cell.get('id', f'id_{cell_id_counter}')
                             cell_id_counter += 1
                             
                             # 셀 내용 추출: p와 table을 원본 순서대로 처리
-                            cell_content = ""
-                            for sub in list(cell):
-                                tag_ends = sub.tag.split('}')[-1] if '}' in sub.tag else sub.tag
-                                if tag_ends == 'p':
+                            cell_parts = []
+                            for sub in cell:
+                                if sub.tag == p_tag:
                                     p_id = sub.get('id', f'table_{table_id}_cell_{row_idx}_{cell_idx}')
                                     p_text = extract_text_content(sub, dtbook_ns)
                                     xhtml_p = f'''
-          <p id="{p_id}">{html.escape(p_text)}</p>'''
-                                    cell_content += xhtml_p
-                                elif tag_ends == 'table':
+          <p id="{p_id}">{escape_text(p_text)}</p>'''
+                                    cell_parts.append(xhtml_p)
+                                elif sub.tag == table_tag:
                                     nested_html = render_dtbook_table_recursive(sub, dtbook_ns, file_index)
-                                    cell_content += nested_html
+                                    cell_parts.append(nested_html)
+                            
+                            cell_content = "".join(cell_parts)
                             
                             # 셀 내용이 없으면 직접 텍스트 사용
                             if not cell_content:
@@ -1071,176 +1189,130 @@ def create_xhtml_from_level1(level1, file_index, dtbook_ns, book_title, book_lan
                                 if cell_text:
                                     p_id = f'table_{table_id}_cell_{row_idx}_{cell_idx}'
                                     cell_content = f'''
-          <p id="{p_id}">{html.escape(cell_text)}</p>'''
+          <p id="{p_id}">{escape_text(cell_text)}</p>'''
                             
                             # 셀 병합 속성 처리
-                            attrs = ''
-                            if cell.get('rowspan'):
-                                attrs += f' rowspan="{cell.get("rowspan")}"'
-                            if cell.get('colspan'):
-                                attrs += f' colspan="{cell.get("colspan")}"'
+                            rowspan = cell.get('rowspan')
+                            colspan = cell.get('colspan')
+                            attr_parts = []
+                            if rowspan:
+                                attr_parts.append(f' rowspan="{rowspan}"')
+                            if colspan:
+                                attr_parts.append(f' colspan="{colspan}"')
+                            attrs = "".join(attr_parts)
                             
                             # th 또는 td 생성 (DAISY Pipeline 방식)
-                            if cell.tag.endswith('th'):
+                            if is_th:
                                 # th에는 scope 속성 추가
                                 scope = 'row' if cell_idx == 0 else 'col'
-                                xhtml += f'''
+                                parts.append(f'''
           <th id="{cell_id}" scope="{scope}"{attrs}>{cell_content}
-          </th>'''
+          </th>''')
                             else:
-                                xhtml += f'''
+                                parts.append(f'''
           <td id="{cell_id}"{attrs}>{cell_content}
-          </td>'''
+          </td>''')
                     
-                    xhtml += '''
-        </tr>'''
+                    parts.append('''
+        </tr>''')
                 
-                xhtml += '''
-      </tbody>'''
+                parts.append('''
+      </tbody>''')
             
-            xhtml += '''
-    </table>'''
+            parts.append('''
+    </table>''')
         else:
-            # 처리되지 않은 요소 로깅 및 빈 p 태그 방지
-            if elem.tag.endswith('imggroup'):
-                # imggroup이 여기까지 왔다면 이미 위에서 처리되었거나 처리 실패
-                print(f"⚠️ level1 IMGGROUP 재처리 방지: {elem.tag}, id: {elem.get('id', 'no-id')}")
-            else:
-                print(f"⚠️ level1에서 처리되지 않은 요소: {elem.tag}, id: {elem.get('id', 'no-id')}")
-                # 알 수 없는 요소를 빈 p 태그로 변환하는 로직 방지
-                # 원본 id를 유지한 빈 p 태그가 생성되지 않도록 함
+            # 처리되지 않은 요소는 로깅만 하고 빈 p 태그로 변환하지 않음
+            logger.debug("⚠️ level1에서 처리되지 않은 요소: %s, id: %s", elem.tag, elem.get('id', 'no-id'))
     
     # XHTML 종료
-    xhtml += '''
-  </section>
-</body>
-
-</html>'''
-    
-    return xhtml
-
-def create_package_opf(book_title, book_author, book_publisher, book_language, book_uid, xhtml_files, daisy_dir):
-    """package.opf 파일 내용을 생성합니다."""
+    parts.append(LEVEL1_XHTML_TAIL)
+    
+    return "".join(parts)
+
+# package.opf 고정 골격 (호출마다 f-string을 다시 만들지 않도록 모듈 수준 상수로 유지)
+# 기계만 읽는 파일이므로 들여쓰기 없이 한 줄에 한 요소로 작성 (메타데이터 값 앞뒤 공백도 제거)
+OPF_HEAD_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" xml:lang="{language}" prefix="dcterms: http://purl.org/dc/terms/ schema: http://schema.org/" unique-identifier="{unique_id}" version="3.0">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:title>{title}</dc:title>
+<dc:identifier id="{unique_id}">{uid}</dc:identifier>
+<dc:language>{language}</dc:language>
+<dc:creator>{author}</dc:creator>
+<dc:publisher>{publisher}</dc:publisher>
+<meta property="dcterms:modified">{modified}</meta>
+<meta property="schema:accessibilityFeature">tableOfContents</meta>
+<meta property="schema:accessMode">textual</meta>
+<meta property="schema:accessibilityHazard">unknown</meta>
+</metadata>
+<manifest>'''
+
+# nav.xhtml / CSS / MODS manifest 항목 (고정 내용)
+OPF_STATIC_ITEMS = '''
+<item href="nav.xhtml" media-type="application/xhtml+xml" id="nav" properties="nav"/>
+<item href="zedai-css.css" media-type="text/css" id="css"/>
+<item href="zedai-mods.xml" media-type="application/mods+xml" id="mods"/>'''
+
+def create_package_opf(book_title, book_author, book_publisher, book_language, book_uid, xhtml_files, image_entries):
+    """package.opf 파일 내용을 생성합니다.
+
+    image_entries는 create_epub3_from_daisy에서 한 번 스캔한 (이름, MIME 타입, 원본 경로) 목록입니다.
+    """
     
     # 고유 식별자 생성 (book_uid를 안전한 ID로 변환)
-    unique_id = "uid_" + re.sub(r'[^a-zA-Z0-9_-]', '_', str(book_uid))
-    
-    opf = f'''<?xml version="1.0" encoding="utf-8"?>
-<package xmlns="http://www.idpf.org/2007/opf"
-         xml:lang="{book_language}"
-         prefix="dcterms: http://purl.org/dc/terms/ schema: http://schema.org/"
-         unique-identifier="{unique_id}"
-         version="3.0">
-    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
-        <dc:title>
-            {html.escape(book_title)}
-        </dc:title>
-        <dc:identifier id="{unique_id}">
-            {book_uid}
-        </dc:identifier>
-        <dc:language>
-            {book_language}
-        </dc:language>
-        <dc:creator>
-            {html.escape(book_author)}
-        </dc:creator>
-        <dc:publisher>
-            {html.escape(book_publisher)}
-        </dc:publisher>
-        <meta property="dcterms:modified">
-            {datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")}
-        </meta>
-        <meta property="schema:accessibilityFeature">
-            tableOfContents
-        </meta>
-        <meta property="schema:accessMode">
-            textual
-        </meta>
-        <meta property="schema:accessibilityHazard">
-            unknown
-        </meta>
-    </metadata>
-    <manifest>'''
+    unique_id = "uid_" + UID_SAFE_PATTERN.sub('_', str(book_uid))
+    modified = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+    
+    parts = [OPF_HEAD_TEMPLATE.format_map({
+        'language': book_language,
+        'unique_id': unique_id,
+        'title': escape_cached(book_title),
+        'uid': book_uid,
+        'author': escape_cached(book_author),
+        'publisher': escape_cached(book_publisher),
+        'modified': modified,
+    })]
     
     # XHTML 파일들 추가
     for i, xhtml_file in enumerate(xhtml_files, 1):
-        opf += f'''
-        <item href="{xhtml_file['filename']}"
-              media-type="application/xhtml+xml"
-              id="item_{i}" />'''
-    
-    # nav.xhtml 추가
-    opf += f'''
-        <item href="nav.xhtml"
-              media-type="application/xhtml+xml"
-              id="nav"
-              properties="nav" />'''
-    
-    # CSS 파일 추가
-    opf += f'''
-        <item href="zedai-css.css"
-              media-type="text/css"
-              id="css" />'''
-    
-    # MODS 파일 추가
-    opf += f'''
-        <item href="zedai-mods.xml"
-              media-type="application/mods+xml"
-              id="mods" />'''
+        parts.append(f'''
+<item href="{xhtml_file['filename']}" media-type="application/xhtml+xml" id="item_{i}"/>''')
+    
+    # nav.xhtml, CSS, MODS 항목 추가 (고정 내용)
+    parts.append(OPF_STATIC_ITEMS)
     
     # 이미지 파일들 추가 (EPUB 3.0 Core Media Types만 지원)
-    if os.path.exists(daisy_dir):
-        all_files = os.listdir(daisy_dir)
-        image_files = [f for f in all_files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.svg'))]
+    image_counter = len(xhtml_files) + 4  # XHTML + nav + css + mods
+    for image_file, mime_type, _ in image_entries:
+        print(f"✅ EPUB Core Media Type 이미지 매니페스트 추가: {image_file} (MIME: {mime_type})")
         
-        image_counter = len(xhtml_files) + 4  # XHTML + nav + css + mods
-        for image_file in image_files:
-            # EPUB 3.0 Core Media Types만 지원
-            if image_file.lower().endswith(('.jpg', '.jpeg')):
-                mime_type = "image/jpeg"
-            elif image_file.lower().endswith('.png'):
-                mime_type = "image/png"  
-            elif image_file.lower().endswith('.gif'):
-                mime_type = "image/gif"
-            elif image_file.lower().endswith('.svg'):
-                mime_type = "image/svg+xml"
-            else:
-                print(f"⚠️ EPUB Core Media Type이 아닌 이미지 형식 건너뛰기: {image_file}")
-                continue
-                
-            print(f"✅ EPUB Core Media Type 이미지 매니페스트 추가: {image_file} (MIME: {mime_type})")
-            
-            # EPUB 3.0 표준 manifest 항목 생성
-            opf += f'''
-        <item href="{image_file}"
-              media-type="{mime_type}"
-              id="img_{image_counter}" />'''
-            image_counter += 1
+        # EPUB 3.0 표준 manifest 항목 생성
+        parts.append(f'''
+<item href="{image_file}" media-type="{mime_type}" id="img_{image_counter}"/>''')
+        image_counter += 1
     
-    opf += '''
-    </manifest>
-    <spine>'''
+    parts.append('''
+</manifest>
+<spine>''')
     
     # spine에 XHTML 파일들 추가 (nav.xhtml은 spine에 포함하지 않음)
     for i, xhtml_file in enumerate(xhtml_files, 1):
-        opf += f'''
-        <itemref idref="item_{i}" />'''
+        parts.append(f'''
+<itemref idref="item_{i}"/>''')
     
-    opf += '''
-    </spine>
-</package>'''
+    parts.append('''
+</spine>
+</package>''')
     
-    return opf
+    return "".join(parts)
 
-def create_nav_xhtml_from_ncx(book_title, nav_points, xhtml_files, ncx_ns, book_language="ko"):
-    """NCX 구조를 기반으로 nav.xhtml 파일 내용을 생성합니다."""
-    
-    nav = f'''<?xml version="1.0" encoding="utf-8"?>
+# nav.xhtml 고정 머리말 (모듈 수준 상수)
+NAV_HEAD_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
 <!DOCTYPE html>
-<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="{book_language}" lang="{book_language}">
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="{language}" lang="{language}">
 <head>
     <meta charset="UTF-8" />
-    <title>{html.escape(book_title)} - Table of Contents</title>
+    <title>{title} - Table of Contents</title>
     <link rel="stylesheet" type="text/css" href="zedai-css.css" />
     <meta name="viewport" content="width=device-width, initial-scale=1.0" />
 </head>
@@ -1248,81 +1320,101 @@ def create_nav_xhtml_from_ncx(book_title, nav_points, xhtml_files, ncx_ns, book_
     <nav epub:type="toc" id="toc" role="doc-toc">
         <h1>목차</h1>
         <ol role="list">'''
+
+def create_nav_xhtml_from_ncx(book_title, nav_points, xhtml_files, ncx_ns, book_language="ko"):
+    """NCX 구조를 기반으로 nav.xhtml 파일 내용을 생성합니다."""
     
-    # xhtml_files와 nav_points를 매칭
-    xhtml_file_map = {i+1: xhtml_file for i, xhtml_file in enumerate(xhtml_files)}
+    # 책 제목은 <title>과 title page 항목에서 재사용 (반복 이스케이프 방지)
+    title_esc = escape_cached(book_title)
+    
+    parts = [NAV_HEAD_TEMPLATE.format_map({'language': book_language, 'title': title_esc})]
     
     # Title page를 첫 번째 항목으로 추가
     if xhtml_files:
         title_file = xhtml_files[0]
-        nav += f'''
-                        <li id="title_page" class="level1"><a href="{title_file['filename']}">{html.escape(title_file['title'])}</a></li>'''
-    
-    # 각 level1 navPoint에 대한 목차 항목 생성
-    for i, nav_point in enumerate(nav_points):
-        if nav_point.get('class') == 'level1':
-            nav_label = nav_point.find(f"{{{ncx_ns}}}navLabel")
-            title = nav_label.find(f"{{{ncx_ns}}}text").text if nav_label is not None and nav_label.find(f"{{{ncx_ns}}}text") is not None else f"Section {i+1}"
-            
-            # 해당하는 XHTML 파일 찾기 (title page 이후부터)
-            xhtml_file = xhtml_file_map.get(i+2, {'filename': f'dtbook-{i+2}.xhtml'})
-            
-            nav += f'''
-                        <li id="{nav_point.get('id', '')}" class="level1"><a href="{xhtml_file['filename']}#{nav_point.get('id', '').replace('ncx_', '')}">{html.escape(title)}</a>'''
-            
-            # 하위 레벨 navPoint들을 재귀적으로 처리
-            sub_nav_points = nav_point.findall(f"{{{ncx_ns}}}navPoint")
-            if sub_nav_points:
-                # level2가 있는지 확인
-                level2_points = [sub_nav for sub_nav in sub_nav_points if sub_nav.get('class', '') == 'level2']
-                if level2_points:
-                    nav += '''
-                                <ol>'''
-                    nav += process_nav_points_recursive(sub_nav_points, xhtml_file, ncx_ns, 2, "                                        ")
-                    nav += '''
-                                </ol>'''
-            
-            nav += '''
-                        </li>'''
+        title_file_esc = title_esc if title_file['title'] == book_title else escape_cached(title_file['title'])
+        parts.append(f'''
+                        <li id="title_page" class="level1"><a href="{title_file['filename']}">{title_file_esc}</a></li>''')
+    
+    # NCX 태그 이름은 한 번만 만들어 재사용
+    nav_point_tag = f"{{{ncx_ns}}}navPoint"
+    
+    # 각 level1 항목 생성: 생성된 XHTML 파일이 자신의 navPoint를 들고 있으므로
+    # 인덱스 계산 없이 그대로 짝지음 (파일이 없는 navPoint는 깨진 링크를 만들지 않음)
+    for xhtml_file in xhtml_files[1:]:
+        nav_point = xhtml_file.get('nav_point')
+        if nav_point is None:
+            raise ValueError(f"XHTML 파일에 대응하는 navPoint가 없습니다: {xhtml_file['filename']}")
+        title = xhtml_file['title']
+        
+        # ncx_ 접두사만 제거 (replace처럼 문자열 전체를 훑지 않음)
+        nav_id = nav_point.get('id', '')
+        target_id = nav_id[4:] if nav_id.startswith('ncx_') else nav_id
+        
+        parts.append(f'''
+                        <li id="{nav_id}" class="level1"><a href="{xhtml_file['filename']}#{target_id}">{escape_text(title)}</a>''')
+        
+        # 하위 레벨 navPoint들을 재귀적으로 처리
+        sub_nav_points = list(nav_point.iterchildren(nav_point_tag))
+        if sub_nav_points:
+            # level2가 있는지 확인
+            if any(sub_nav.get('class', '') == 'level2' for sub_nav in sub_nav_points):
+                parts.append('''
+                                <ol>''')
+                parts.append(process_nav_points_recursive(sub_nav_points, xhtml_file, ncx_ns, 2, "                                        "))
+                parts.append('''
+                                </ol>''')
+        
+        parts.append('''
+                        </li>''')
     
-    nav += '''
+    parts.append('''
         </ol>
     </nav>
 </body>
-</html>'''
+</html>''')
     
-    return nav
+    return "".join(parts)
 
 def process_nav_points_recursive(nav_points, xhtml_file, ncx_ns, current_level, indent="                                        "):
     """재귀적으로 모든 레벨의 navPoint를 처리합니다."""
-    nav_content = ""
+    parts = []
+    
+    # 루프마다 다시 만들지 않도록 비교 문자열과 태그 이름을 미리 준비
+    current_class = f'level{current_level}'
+    next_class = f'level{current_level + 1}'
+    nav_label_tag = f"{{{ncx_ns}}}navLabel"
+    text_tag = f"{{{ncx_ns}}}text"
+    nav_point_tag = f"{{{ncx_ns}}}navPoint"
     
     for nav_point in nav_points:
         level_class = nav_point.get('class', '')
-        if level_class == f'level{current_level}':
+        if level_class == current_class:
             # 현재 레벨의 navPoint 처리
-            nav_label = nav_point.find(f"{{{ncx_ns}}}navLabel")
+            nav_label = nav_point.find(nav_label_tag)
             if nav_label is not None:
-                title = nav_label.find(f"{{{ncx_ns}}}text").text if nav_label.find(f"{{{ncx_ns}}}text") is not None else ""
-                nav_content += f'''
-{indent}<li id="{nav_point.get('id', '')}" class="{level_class}"><a href="{xhtml_file['filename']}#{nav_point.get('id', '').replace('ncx_', '')}">{html.escape(title)}</a>'''
+                text_elem = nav_label.find(text_tag)
+                title = text_elem.text if text_elem is not None else ""
+                nav_id = nav_point.get('id', '')
+                target_id = nav_id[4:] if nav_id.startswith('ncx_') else nav_id
+                parts.append(f'''
+{indent}<li id="{nav_id}" class="{level_class}"><a href="{xhtml_file['filename']}#{target_id}">{escape_text(title)}</a>''')
                 
                 # 하위 레벨 navPoint들 찾기
-                sub_nav_points = nav_point.findall(f"{{{ncx_ns}}}navPoint")
+                sub_nav_points = list(nav_point.iterchildren(nav_point_tag))
                 if sub_nav_points:
                     # 다음 레벨의 navPoint가 있는지 확인
-                    next_level_points = [sub_nav for sub_nav in sub_nav_points if sub_nav.get('class', '') == f'level{current_level + 1}']
-                    if next_level_points:
-                        nav_content += f'''
-{indent}        <ol>'''
-                        nav_content += process_nav_points_recursive(sub_nav_points, xhtml_file, ncx_ns, current_level + 1, indent + "        ")
-                        nav_content += f'''
-{indent}        </ol>'''
+                    if any(sub_nav.get('class', '') == next_class for sub_nav in sub_nav_points):
+                        parts.append(f'''
+{indent}        <ol>''')
+                        parts.append(process_nav_points_recursive(sub_nav_points, xhtml_file, ncx_ns, current_level + 1, indent + "        "))
+                        parts.append(f'''
+{indent}        </ol>''')
                 
-                nav_content += f'''
-{indent}</li>'''
+                parts.append(f'''
+{indent}</li>''')
     
-    return nav_content
+    return "".join(parts)
 
 def create_css_content():
     """CSS 파일 내용을 생성합니다."""
@@ -1617,21 +1709,20 @@ nav a:hover {
     }
 }'''
 
-def create_mods_xml(book_title, book_author, book_language):
-    """zedai-mods.xml 파일 내용을 생성합니다."""
-    return f'''<?xml version="1.0" encoding="UTF-8"?>
+# zedai-mods.xml 골격 (모듈 수준 상수)
+MODS_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
 <mods xmlns="http://www.loc.gov/mods/v3" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.loc.gov/mods/v3 http://www.loc.gov/standards/mods/v3/mods-3-7.xsd">
     <titleInfo>
-        <title>{html.escape(book_title)}</title>
+        <title>{title}</title>
     </titleInfo>
     <name type="personal">
-        <namePart>{html.escape(book_author)}</namePart>
+        <namePart>{author}</namePart>
         <role>
             <roleTerm type="text">author</roleTerm>
         </role>
     </name>
     <language>
-        <languageTerm type="code" authority="iso639-2b">{book_language}</languageTerm>
+        <languageTerm type="code" authority="iso639-2b">{language}</languageTerm>
     </language>
     <physicalDescription>
         <form authority="marcform">electronic</form>
@@ -1640,42 +1731,87 @@ def create_mods_xml(book_title, book_author, book_language):
     <typeOfResource>text</typeOfResource>
 </mods>'''
 
-def zip_epub_output(source_dir, output_zip_filename):
-    """지정된 폴더의 내용을 EPUB ZIP 파일로 압축합니다."""
+def create_mods_xml(book_title, book_author, book_language):
+    """zedai-mods.xml 파일 내용을 생성합니다."""
+    return MODS_TEMPLATE.format_map({
+        'title': escape_cached(book_title),
+        'author': escape_cached(book_author),
+        'language': book_language,
+    })
+
+def zip_epub_output(source_dir, output_zip_filename, compresslevel=6):
+    """지정된 폴더의 내용을 EPUB ZIP 파일로 압축합니다.
+
+    compresslevel은 DEFLATE로 압축하는 항목(XHTML, CSS 등)에만 적용되며,
+    이미 압축된 이미지/오디오는 ZIP_STORED로 저장합니다.
+    """
     
     if not os.path.isdir(source_dir):
         print(f"오류: 소스 디렉토리를 찾을 수 없습니다 - {source_dir}")
         return
 
     try:
-        print(f"'{source_dir}' 폴더를 '{output_zip_filename}' EPUB 파일로 압축 중...")
-        
-        with zipfile.ZipFile(output_zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # mimetype 파일을 먼저 추가 (압축하지 않음)
-            mimetype_path = os.path.join(source_dir, "mimetype")
-            if os.path.exists(mimetype_path):
-                zipf.write(mimetype_path, arcname="mimetype", compress_type=zipfile.ZIP_STORED)
-                print("  추가 중: mimetype (압축 없음)")
-            
-            # 나머지 파일들을 압축하여 추가
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    archive_name = os.path.relpath(file_path, source_dir)
-                    
-                    # mimetype은 이미 추가했으므로 건너뛰기
-                    if archive_name == "mimetype":
-                        continue
-                    
-                    print(f"  추가 중: {archive_name}")
-                    zipf.write(file_path, arcname=archive_name)
-        
-        print(f"EPUB 파일 생성 완료: {output_zip_filename}")
+        _write_epub_zip(source_dir, output_zip_filename, compresslevel)
     except Exception as e:
         print(f"EPUB 파일 생성 중 오류 발생: {e}")
+        logger.debug("zip_epub_output 예외 상세", exc_info=True)
+
+def _write_epub_zip(source_dir, output_zip_filename, compresslevel):
+    """zip_epub_output의 실제 압축 작업. 예외 처리는 호출하는 쪽에서 합니다."""
+    print(f"'{source_dir}' 폴더를 '{output_zip_filename}' EPUB 파일로 압축 중...")
+    
+    with open(output_zip_filename, 'wb', buffering=ZIP_OUTPUT_BUFSIZE) as zip_out, \
+            zipfile.ZipFile(zip_out, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zipf:
+        # mimetype 파일을 먼저 추가 (압축하지 않음)
+        mimetype_path = os.path.join(source_dir, "mimetype")
+        if os.path.exists(mimetype_path):
+            zipf.write(mimetype_path, arcname="mimetype", compress_type=zipfile.ZIP_STORED)
+            print("  추가 중: mimetype (압축 없음)")
+        
+        # 항목별 로그는 디버그 레벨일 때만 남기고, 완료 시 항목 수만 출력 (성능 최적화)
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        entry_count = 0
+        failed_files = []
+        # 복사 버퍼는 아카이브 전체에서 하나만 사용
+        copy_view = memoryview(bytearray(IO_BUFSIZE))
+        
+        # 나머지 파일들을 압축하여 추가
+        # 항목별 압축은 순차로 수행 (create_epub3_from_daisy의 장별 압축과 같은 이유)
+        for file_path, archive_name in iter_relative_files(source_dir):
+            # mimetype은 이미 추가했으므로 건너뛰기
+            if archive_name == "mimetype":
+                continue
+            
+            ext = os.path.splitext(archive_name)[1].lower()
+            compress_type = zipfile.ZIP_STORED if ext in PRECOMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            if debug_enabled:
+                logger.debug("  추가 중: %s", archive_name)
+            # ZipFile.write의 8 KiB 복사 대신 1 MiB 버퍼 스트리밍 (대용량 오디오/이미지)
+            # 읽을 수 없는 파일 하나 때문에 전체 압축을 중단하지 않고 기록 후 계속 진행
+            try:
+                stream_file_to_zip(zipf, file_path, archive_name, compress_type, copy_view)
+            except OSError as e:
+                # 항목이 이미 만들어진 뒤의 실패는 아카이브가 불완전하므로 그대로 전파
+                try:
+                    zipf.getinfo(archive_name)
+                except KeyError:
+                    pass
+                else:
+                    raise
+                failed_files.append(archive_name)
+                logger.warning("EPUB 항목 추가 실패: %s - %s", archive_name, e)
+                continue
+            entry_count += 1
+    
+    print(f"EPUB 파일 생성 완료: {output_zip_filename} ({entry_count}개 파일)")
+    if failed_files:
+        print(f"❌ 경고: {len(failed_files)}개 파일을 추가하지 못했습니다: {', '.join(failed_files)}")
 
 def main():
     """메인 함수 - 명령행 인터페이스"""
+    # argparse는 CLI에서만 필요하므로 API/워커에서 모듈을 불러올 때는 로드하지 않음
+    import argparse
+    
     parser = argparse.ArgumentParser(description="DAISY3에서 EPUB3로 변환")
     parser.add_argument("daisy_dir", help="DAISY 파일들이 있는 디렉토리 경로")
     parser.add_argument("output_dir", help="출력 디렉토리 경로")
@@ -1684,9 +1820,15 @@ def main():
     parser.add_argument("--publisher", help="출판사")
     parser.add_argument("--language", default="ko", help="언어 코드 (기본값: ko)")
     parser.add_argument("--zip", action="store_true", help="EPUB ZIP 파일로 압축")
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(0, 10), metavar="0-9",
+                        help="--zip 사용 시 DEFLATE 압축 레벨 (기본값: 6)")
+    parser.add_argument("--verbose", action="store_true", help="요소별 디버그 로그 출력")
     
     args = parser.parse_args()
     
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    
     try:
         # EPUB3 파일 생성
         epub_dir = create_epub3_from_daisy(
@@ -1701,7 +1843,7 @@ def main():
         # ZIP 압축 옵션이 있으면 EPUB 파일 생성
         if args.zip:
             epub_filename = os.path.join(args.output_dir, "result.epub")
-            zip_epub_output(epub_dir, epub_filename)
+            zip_epub_output(epub_dir, epub_filename, args.compress_level)
             
     except Exception as e:
         print(f"오류: {e}")
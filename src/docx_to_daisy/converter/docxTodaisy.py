@@ -11,15 +11,49 @@ from docx.oxml.ns import qn  # XML 네임스페이스 처리
 from lxml import etree  # lxml 라이브러리
 from datetime import datetime
 from docx_to_daisy.markers import MarkerProcessor  # 마커 처리기 임포트
-import gc
 from docx.table import Table as DocxTable
-from docx_to_daisy.converter.utils import find_all_images, split_text_to_words, analyze_image_context, html_escape, BR_PATTERN, TABLE_TITLE_PATTERN
+from docx_to_daisy.converter.utils import find_all_images, split_text_to_words, analyze_image_context, html_escape, BR_PATTERN, TABLE_TITLE_PATTERN, IMAGE_MIME_TYPES, stream_file_to_zip, iter_relative_files, PRECOMPRESSED_EXTENSIONS, IO_BUFSIZE, ZIP_OUTPUT_BUFSIZE
 from docx_to_daisy.converter.validator import DaisyValidator, ValidationResult
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 컴파일된 정규식 패턴 (성능 최적화)
+# 예: "Heading 1", "heading1", "제목 1", "제목1", "Heading 2 + Bold", 등
+HEADING_STYLE_PATTERN = re.compile(r"(?:heading|제목)\s*([1-6])\b")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+DIGITS_PATTERN = re.compile(r"\d+")
+
+# 제목 레벨(1~6)별 DTBook 레벨 요소/클래스 이름과 제목 태그 (level - 1로 인덱싱, 성능 최적화)
+LEVEL_CLASS_NAMES = tuple(f"level{i}" for i in range(1, 7))
+HEADING_TAGS = tuple(f"h{i}" for i in range(1, 7))
+
+# 출력 파일별 XML 선언 + DOCTYPE (저장할 때마다 문자열을 인코딩하지 않도록 bytes로 둠, 성능 최적화)
+DTBOOK_XML_HEADER = (
+    b'<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+    b'<!DOCTYPE dtbook PUBLIC "-//NISO//DTD dtbook 2005-3//EN" "http://www.daisy.org/z3986/2005/dtbook-2005-3.dtd">\n'
+)
+OPF_XML_HEADER = (
+    b'<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+    b'<!DOCTYPE package PUBLIC "+//ISBN 0-9673008-1-9//DTD OEB 1.2 Package//EN" "http://openebook.org/dtds/oeb-1.2/oebpkg12.dtd">\n'
+)
+SMIL_XML_HEADER = (
+    b'<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'
+    b'<!DOCTYPE smil PUBLIC "-//NISO//DTD dtbsmil 2005-2//EN" "http://www.daisy.org/z3986/2005/dtbsmil-2005-2.dtd">\n'
+)
+NCX_XML_HEADER = (
+    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+    b'<!DOCTYPE ncx PUBLIC "-//NISO//DTD ncx 2005-1//EN" "http://www.daisy.org/z3986/2005/ncx-2005-1.dtd" >\n'
+)
+RES_XML_HEADER = (
+    b'<?xml version="1.0" encoding="utf-8"?>\n'
+    b'<!DOCTYPE resources\n  PUBLIC "-//NISO//DTD resource 2005-1//EN" "http://www.daisy.org/z3986/2005/resource-2005-1.dtd">\n'
+)
+
+# DAISY XML 들여쓰기 여부 (DAISY_PRETTY=0 이면 들여쓰기 없이 저장하여 직렬화 시간 단축)
+PRETTY_PRINT_XML = os.environ.get("DAISY_PRETTY", "1") != "0"
+
 def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=None, book_publisher=None, book_language="ko"):
     """DOCX 파일을 DAISY 형식으로 변환합니다.
 
@@ -33,22 +67,11 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     """
     # 이미지 설명 처리 함수 정의
     def get_clean_description(desc_list):
-        """이미지 설명 목록에서 중복을 제거하고 깔끔한 설명을 반환합니다"""
-        if not desc_list:
-            return None
-        
-        # 중복 제거
-        unique_desc = []
-        seen = set()
-        for desc in desc_list:
-            if desc not in seen:
-                seen.add(desc)
-                unique_desc.append(desc)
-        
-        # 설명이 너무 길면 첫 번째 항목만 반환
-        if len(unique_desc) > 0:
-            return unique_desc[0]
-        return None
+        """이미지 설명 목록에서 첫 번째 설명을 반환합니다
+
+        중복 제거 후의 첫 항목은 항상 원래 목록의 첫 항목이므로 집합을 만들지 않습니다.
+        """
+        return desc_list[0] if desc_list else None
     
     # --- 출력 디렉토리 생성 ---
     timings = {}
@@ -110,8 +133,12 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     element_parent_map = {}
     element_type_map = {}
     
+    # document.paragraphs는 접근할 때마다 Paragraph 목록을 새로 만들므로
+    # 한 번만 구해서 인덱싱, 이미지 탐색, 단락 처리, 표 위치 계산에 재사용
+    paragraphs = document.paragraphs
+
     # 단락 인덱싱
-    for para_idx, para in enumerate(document.paragraphs):
+    for para_idx, para in enumerate(paragraphs):
         pid = id(para._element)
         paragraph_id_map[pid] = {
             'index': para_idx,
@@ -198,7 +225,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     # 1. 문서에서 모든 이미지 찾기 (표 안/밖 분류)
     t_images = time.time()
     print("문서에서 이미지 찾는 중...")
-    images = find_all_images(document)
+    images = find_all_images(document, paragraphs)
     print(f"총 {len(images)}개의 이미지 발견")
 
     # 표 안/밖 이미지 분류
@@ -231,21 +258,20 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     # 2. 문서에서 모든 이미지 관계 미리 수집 (성능 최적화)
     print(f"문서에서 이미지 관계 수집 중...")
     image_counter = 0
-    image_relations = {}
     
-    # 모든 이미지 관계를 딕셔너리로 미리 수집 (O(1) 접근)
+    # 모든 이미지 관계의 파일 확장자를 rId -> 확장자 딕셔너리로 미리 계산 (O(1) 접근)
+    # 본문 이미지, 표 셀 이미지, 매니페스트가 모두 이 값을 사용하므로 관계마다 한 번만 계산
+    image_ext_map = {}
     for rel_id, rel in document.part.rels.items():
         if "image" in rel.reltype:
             try:
-                image_relations[rel_id] = rel
+                ext = os.path.splitext(rel.target_ref)[1] if hasattr(rel, 'target_ref') else ""
+                image_ext_map[rel_id] = ext or ".jpeg"
                 print(f"이미지 관계 발견: {rel_id}, {rel.reltype}")
             except Exception as e:
                 print(f"이미지 관계 처리 오류: {str(e)}")
     
-    print(f"문서에서 {len(image_relations)}개의 이미지 관계 발견")
-    
-    # 이미지 매핑 정보 초기화
-    image_mapping = {}  # 이미지 번호 -> 이미지 관계 매핑
+    print(f"문서에서 {len(image_ext_map)}개의 이미지 관계 발견")
 
     # 이미지 처리 - 실제 문서 위치 기반으로 처리
     for i, img in enumerate(standalone_images, 1):
@@ -259,23 +285,14 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
             elem_id = f"id_{element_counter}"
             sent_id = f"id_{sent_counter}"
             
-            # 이미지 파일 저장
-            image_ext = ".jpeg"
-            try:
-                if 'image_rid' in img:
-                    rel = image_relations.get(img['image_rid'])  # 미리 수집한 관계 사용
-                    if rel and hasattr(rel, 'target_ref'):
-                        ext = os.path.splitext(rel.target_ref)[1]
-                        if ext:
-                            image_ext = ext
-            except:
-                pass
+            # 이미지 파일 저장 (미리 계산한 확장자 사용)
+            image_ext = image_ext_map.get(img.get('image_rid'), ".jpeg")
             
             image_filename = f"image{img_num}{image_ext}"
             image_path = os.path.join(output_dir, image_filename)
             
             # 이미지 데이터 저장(큰 버퍼)
-            with open(image_path, "wb", buffering=1<<20) as img_file:
+            with open(image_path, "wb", buffering=IO_BUFSIZE) as img_file:
                 img_file.write(img['image_data'])
             # 상세 콘솔 출력 제거 (성능)
             
@@ -303,27 +320,63 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     print(f"{image_counter}개 이미지 추출 완료.")
     timings["extract_images"] = time.time() - t_images
 
-    # 메모리 정리 (images는 표 처리에서도 사용하므로 유지)
-    del image_relations
-    del image_mapping
-    gc.collect()
+    # image_ext_map은 표 셀 이미지의 확장자를 정할 때도 사용하므로 유지
 
     # DOCX의 단락(paragraph)을 순회하며 구조 파악
     t_paragraphs = time.time()
     print("DOCX 파일 분석 중...")
-    print(f"총 {len(document.paragraphs)}개의 단락을 처리합니다.")
+    total_paragraphs = len(paragraphs)
+    print(f"총 {total_paragraphs}개의 단락을 처리합니다.")
+    
+    # 스타일 ID -> (요소 타입, 레벨) 캐시: 같은 스타일의 단락은 스타일 조회/정규식을 다시 하지 않음
+    style_type_cache = {}
+    
+    # 최대 페이지 번호는 pagenum 요소를 추가할 때 바로 누적 (content_structure를 다시 순회하지 않음)
+    max_page_number = 0
+
+    def parse_page_number(value):
+        """페이지 마커 값에서 숫자 페이지 번호를 구합니다 (로마 숫자 등 비숫자 표기는 None).
+
+        페이지 마커 값이 "1", "0-9", "8.1" 등 다양한 포맷일 수 있으므로
+        '-'는 마지막 숫자 세그먼트, '.'는 첫 숫자 세그먼트를 페이지 번호로 본다.
+        """
+        if '-' in value:
+            nums = DIGITS_PATTERN.findall(value)
+            return int(nums[-1]) if nums else None
+        if '.' in value:
+            nums = DIGITS_PATTERN.findall(value)
+            return int(nums[0]) if nums else None
+        try:
+            return int(value)
+        except ValueError:
+            return None
     
     # 단락 처리
-    for para_idx, para in enumerate(document.paragraphs):
+    for para_idx, para in enumerate(paragraphs):
         # 진행 상황 로그 (100개 단락마다)
         if para_idx % 100 == 0:
-            print(f"단락 처리 진행 중: {para_idx}/{len(document.paragraphs)} ({para_idx/len(document.paragraphs)*100:.1f}%)")
+            print(f"단락 처리 진행 중: {para_idx}/{total_paragraphs} ({para_idx/total_paragraphs*100:.1f}%)")
         
         text_raw = para.text
-        style_name = para.style.name.lower()
+        
+        # 스타일 이름에 따른 구조 매핑 (견고하게 처리)
+        style_id = para._p.style
+        style_info = style_type_cache.get(style_id)
+        if style_info is None:
+            # 스타일 이름 정규화 및 다양한 변형 대응
+            normalized_style = WHITESPACE_PATTERN.sub(" ", (para.style.name or "").strip().lower())
+            heading_match = HEADING_STYLE_PATTERN.search(normalized_style)
+            if heading_match:
+                level_num = int(heading_match.group(1))
+                style_info = (f"h{level_num}", level_num)
+            else:
+                style_info = ("p", 0)
+            style_type_cache[style_id] = style_info
+        element_type, element_level = style_info
 
         # <br/> 태그 기준으로 세그먼트를 분리 (성능 최적화)
-        br_segments = BR_PATTERN.split(text_raw)
+        # 태그가 없는 대부분의 단락은 정규식을 거치지 않음
+        br_segments = BR_PATTERN.split(text_raw) if '<' in text_raw else (text_raw,)
 
         # 세그먼트별 처리
         for seg_idx, seg_text in enumerate(br_segments):
@@ -371,6 +424,13 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     "insert_before": True
                 })
 
+                # 최대 페이지 번호 누적 (숫자 페이지만)
+                page_value = str(marker.value).strip()
+                if page_value:
+                    page_num = parse_page_number(page_value)
+                    if page_num is not None and page_num > max_page_number:
+                        max_page_number = page_num
+
                 # 마커만 있고 실제 내용이 없는 경우 건너뜀
                 if not processed_text.strip():
                     continue
@@ -383,28 +443,14 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
             elem_id = f"p_{element_counter}"
             sent_id = f"sent_{sent_counter}"
 
-            # 단어 분리
-            words = split_text_to_words(processed_text)
-
-            # 스타일 이름에 따른 구조 매핑 (견고하게 처리)
-            element_type = "p"
-            element_level = 0
-
-            # 스타일 이름 정규화 및 다양한 변형 대응
-            normalized_style = (style_name or "").strip().lower()
-            normalized_style = re.sub(r"\s+", " ", normalized_style)
-            # 예: "Heading 1", "heading1", "제목 1", "제목1", "Heading 2 + Bold", 등
-            heading_match = re.search(r"(?:heading|제목)\s*([1-6])\b", normalized_style)
-            if heading_match:
-                level_num = int(heading_match.group(1))
-                element_type = f"h{level_num}"
-                element_level = level_num
+            # 단어 분리 후 본문에 쓸 문자열로 한 번만 합침 (단어 목록은 보관하지 않음)
+            display_text = " ".join(split_text_to_words(processed_text))
 
             # 스타일 이름에 따른 구조 매핑
             content_structure.append({
                 "type": element_type,
                 "text": processed_text,
-                "words": words,
+                "display_text": display_text,
                 "id": elem_id,
                 "sent_id": sent_id,
                 "level": element_level,
@@ -424,21 +470,66 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     body_children = list(document._element.body.iterchildren())
     element_positions = {}
     
-    # 모든 요소의 위치를 미리 계산
-    for idx, child in enumerate(body_children):
-        child_id = id(child)
-        element_positions[child_id] = idx
-    
     # 단락 인덱스 매핑을 미리 계산 (성능 최적화)
     paragraph_index_map = {}
-    for para_idx, para in enumerate(document.paragraphs):
+    for para_idx, para in enumerate(paragraphs):
         para_id = id(para._element)
         paragraph_index_map[para_id] = para_idx
     
+    # 모든 요소의 위치와, 각 요소 앞에 오는 가장 큰 단락 인덱스를 한 번의 순회로 계산
+    # (표마다 body_children 앞부분을 다시 훑지 않도록 함)
+    max_para_before = {}
+    running_max_para = -1
+    for idx, child in enumerate(body_children):
+        child_id = id(child)
+        element_positions[child_id] = idx
+        max_para_before[child_id] = running_max_para
+        if child.tag.endswith('p'):  # 단락인 경우
+            para_idx = paragraph_index_map.get(child_id, -1)
+            if para_idx > running_max_para:
+                running_max_para = para_idx
+    
     if len(document.tables) > 0:
         print(f"문서에 {len(document.tables)}개의 표 발견")
         
         # 병합 정보 계산 및 표 데이터 추출 헬퍼
+        def compute_merge_spans(row_segments):
+            """행별 그리드 세그먼트에서 셀별 top-left 위치, colspan, rowspan을 계산합니다.
+
+            세로 병합(vMerge)을 시작 셀마다 아래로 다시 훑지 않고, 진행 중인 병합을
+            시작 그리드 열 기준으로 들고 다니며 행을 한 번만 순회합니다.
+            """
+            top_left_of = {}
+            width_map = {}
+            rowspan_map = {}
+            open_spans = {}  # 시작 그리드 열 -> (시작 행, 끝 그리드 열)
+            for r, segs in enumerate(row_segments):
+                seg_at = {}
+                for seg in segs:
+                    gs, ge = seg['grid_start'], seg['grid_end']
+                    for gg in range(gs, ge + 1):
+                        top_left_of[(r, gg)] = (r, gs)
+                        seg_at[gg] = seg
+                    width_map[(r, gs)] = seg['colspan']
+
+                # 위 행에서 이어지는 세로 병합: 같은 열의 세그먼트가 continue일 때만 연장
+                next_open = {}
+                for gs, (r0, ge) in open_spans.items():
+                    target = seg_at.get(gs)
+                    if target is not None and target['v_state'] == 'continue':
+                        rowspan_map[(r0, gs)] += 1
+                        for gg in range(gs, ge + 1):
+                            top_left_of[(r, gg)] = (r0, gs)
+                        next_open[gs] = (r0, ge)
+
+                # 이 행에서 새로 시작하는 세로 병합
+                for seg in segs:
+                    if seg['v_state'] == 'restart':
+                        rowspan_map[(r, seg['grid_start'])] = 1
+                        next_open[seg['grid_start']] = (r, seg['grid_end'])
+                open_spans = next_open
+            return top_left_of, width_map, rowspan_map
+
         def compute_cell_merge_info_for_table(table_obj):
             """주어진 표에 대한 병합 정보를 계산하여 반환합니다."""
             info_map = {}
@@ -494,42 +585,12 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                 row_segments.append(segments)
 
             # 2) top-left 매핑, rowspan/colspan 계산
-            top_left_of = {}
-            width_map = {}
-            rowspan_map = {}
-            for r, segs in enumerate(row_segments):
-                for seg in segs:
-                    gs, ge = seg['grid_start'], seg['grid_end']
-                    for gg in range(gs, ge + 1):
-                        top_left_of[(r, gg)] = (r, gs)
-                    width_map[(r, gs)] = seg['colspan']
-
-            for r0, segs in enumerate(row_segments):
-                for seg in segs:
-                    if seg['v_state'] == 'restart':
-                        gs, ge = seg['grid_start'], seg['grid_end']
-                        rs = 1
-                        rr = r0 + 1
-                        while rr < len(row_segments):
-                            target = None
-                            for s in row_segments[rr]:
-                                if s['grid_start'] <= gs <= s['grid_end']:
-                                    target = s
-                                    break
-                            if target is None:
-                                break
-                            if target['v_state'] == 'continue':
-                                rs += 1
-                                for gg in range(gs, ge + 1):
-                                    top_left_of[(rr, gg)] = (r0, gs)
-                                rr += 1
-                            else:
-                                break
-                        rowspan_map[(r0, gs)] = rs
+            top_left_of, width_map, rowspan_map = compute_merge_spans(row_segments)
 
             # 3) (row_idx, col_idx)별 병합 정보 생성
-            for r, row in enumerate(table_obj.rows):
-                num_cols = len(row.cells)
+            # 행의 그리드 칸 수는 세그먼트 너비의 합과 같으므로 row.cells를 다시 만들지 않음
+            for r, segs in enumerate(row_segments):
+                num_cols = segs[-1]['grid_end'] + 1 if segs else 0
                 for c in range(num_cols):
                     tl = top_left_of.get((r, c), (r, c))
                     if tl == (r, c):
@@ -591,37 +652,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     g += colspan
                 row_segments.append(segments)
 
-            top_left_of = {}
-            width_map = {}
-            rowspan_map = {}
-            for r, segs in enumerate(row_segments):
-                for seg in segs:
-                    gs, ge = seg['grid_start'], seg['grid_end']
-                    for gg in range(gs, ge + 1):
-                        top_left_of[(r, gg)] = (r, gs)
-                    width_map[(r, gs)] = seg['colspan']
-            for r0, segs in enumerate(row_segments):
-                for seg in segs:
-                    if seg['v_state'] == 'restart':
-                        gs, ge = seg['grid_start'], seg['grid_end']
-                        rs = 1
-                        rr = r0 + 1
-                        while rr < len(row_segments):
-                            target = None
-                            for s in row_segments[rr]:
-                                if s['grid_start'] <= gs <= s['grid_end']:
-                                    target = s
-                                    break
-                            if target is None:
-                                break
-                            if target['v_state'] == 'continue':
-                                rs += 1
-                                for gg in range(gs, ge + 1):
-                                    top_left_of[(rr, gg)] = (r0, gs)
-                                rr += 1
-                            else:
-                                break
-                        rowspan_map[(r0, gs)] = rs
+            top_left_of, width_map, rowspan_map = compute_merge_spans(row_segments)
 
             # 2) 행/셀 수집 (문단/표 순서 보존)
             for r_idx, tr in enumerate(tbl_el.iterfind('./{%s}tr' % W_NS)):
@@ -777,14 +808,9 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
                 data['rows'].append(row_data)
 
-            # 열 데이터
+            # 열 데이터 (행 데이터에서 파생: 셀 텍스트를 다시 계산하지 않음)
             for col_idx in range(len(table_obj.columns)):
-                col_data = []
-                for row in table_obj.rows:
-                    if col_idx < len(row.cells):
-                        cell_text = " ".join(para.text for para in row.cells[col_idx].paragraphs)
-                        col_data.append(cell_text)
-                data['cols'].append(col_data)
+                data['cols'].append([row_data[col_idx] for row_data in data['rows'] if col_idx < len(row_data)])
 
             return data
         
@@ -812,15 +838,8 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
             table_body_index = element_positions.get(tid, -1)
             
             if table_body_index != -1:
-                # 표 이전의 단락들을 확인하여 가장 큰 단락 인덱스 찾기
-                max_para_before_table = -1
-                for idx in range(table_body_index):
-                    child = body_children[idx]
-                    if child.tag.endswith('p'):  # 단락인 경우
-                        # 미리 계산된 단락 인덱스 매핑 사용
-                        para_idx = paragraph_index_map.get(id(child), -1)
-                        if para_idx != -1:
-                            max_para_before_table = max(max_para_before_table, para_idx)
+                # 표 이전 단락 중 가장 큰 단락 인덱스 (미리 계산된 값 사용)
+                max_para_before_table = max_para_before[tid]
                 
                 # 표의 위치를 가장 큰 단락 인덱스 + 1로 설정
                 if max_para_before_table >= 0:
@@ -883,8 +902,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
         del element_parent_map
     if 'element_type_map' in locals():
         del element_type_map
-    # image_relations는 이후 OPF, DTBook 단계에서도 사용되므로 유지
-    gc.collect()
+    # image_ext_map은 이후 OPF, DTBook 단계에서도 사용되므로 유지
 
     # 콘텐츠를 위치에 따라 정렬 - 이미지와 텍스트의 정확한 순서 보장
     t_sort = time.time()
@@ -897,46 +915,58 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     print(f"총 {len(content_structure)}개의 구조 요소 분석 완료.")
     timings["sort_content"] = time.time() - t_sort
 
+    # DTBook/SMIL/NCX에서 공통으로 쓰는 참조 문자열을 요소마다 한 번만 생성 (성능 최적화)
+    # 같은 순회에서 OPF/NCX가 필요로 하는 요소만 유형별로 모아 두어,
+    # 이후 단계가 전체 content_structure를 다시 훑지 않도록 함
+    image_items = []
+    table_items = []
+    heading_items = []
+    pagenum_items = []
+    note_items = []  # 각주/주석 마커가 있는 요소
+    max_heading_level = 0
+    for item in content_structure:
+        item_type = item["type"]
+        if item_type == "image":
+            image_items.append(item)
+        elif item_type == "table":
+            table_items.append(item)
+        elif item_type == "pagenum":
+            pagenum_items.append(item)
+        elif item["level"]:
+            # 제목 요소는 생성 시 level(1~6)이 기록되어 있으므로 type 문자열을 다시 해석하지 않음
+            heading_items.append(item)
+            max_heading_level = max(max_heading_level, item["level"])
+        if any(marker.type in ["note", "annotation"] for marker in item.get("markers", [])):
+            note_items.append(item)
+
+        if item_type == "pagenum":
+            # 페이지 번호는 요소 ID 대신 페이지 값 기반 ID 사용
+            ref_id = f"page_{item['text']}_{item['text']}"
+        else:
+            ref_id = item["id"]
+        smil_par_id = f"smil_par_{ref_id}"
+        item["ref_id"] = ref_id
+        item["smil_par_id"] = smil_par_id
+        item["smilref"] = f"dtbook.smil#{smil_par_id}"
+        item["text_src"] = f"dtbook.xml#{ref_id}"
+
+        # 페이지 외 마커의 DTBook/SMIL 요소 정보도 한 번만 만들어 두고 각 생성 단계에서 재사용
+        # (DTBook 트리는 페이지 마커 중복 확인에만 쓰이며, 페이지 마커는 별도 요소로 처리되므로 전달하지 않음)
+        item["marker_elements"] = [
+            (marker,
+             MarkerProcessor.create_dtbook_element(marker, None),
+             MarkerProcessor.create_smil_element(marker, item["id"]))
+            for marker in item.get("markers", [])
+            if marker.type != "page"
+        ]
+
     # --- 1. DTBook XML 생성 (dtbook.xml) ---
     t_dtbook = time.time()
     print("DTBook 생성 중...")
     dtbook_ns = "http://www.daisy.org/z3986/2005/dtbook/"
     dc_ns = "http://purl.org/dc/elements/1.1/"
-
-    # 페이지 카운터 초기화
-    total_pages = 0
-    max_page_number = 0
-    
-    # pagenum 요소 기준으로 페이지 정보 계산 (중복 방지)
-    page_values = []
-    for item in content_structure:
-        if item.get("type") == "pagenum":
-            val = str(item.get("text", "")).strip()
-            if val:
-                page_values.append(val)
-
-    total_pages = len(page_values)
-
-    # 최대 숫자 페이지 계산 (로마 숫자 등 비숫자 표기는 제외)
-    for value in page_values:
-        # 페이지 마커 값이 "1", "0-9", "8.1" 등 다양한 포맷일 수 있으므로
-        # 규칙: '-'는 마지막 숫자 세그먼트, '.'는 첫 숫자 세그먼트를 페이지 번호로 본다.
-        page_num = None
-        if '-' in value:
-            nums = re.findall(r'\d+', value)
-            if nums:
-                page_num = int(nums[-1])
-        elif '.' in value:
-            nums = re.findall(r'\d+', value)
-            if nums:
-                page_num = int(nums[0])
-        else:
-            try:
-                page_num = int(value)
-            except ValueError:
-                page_num = None
-        if page_num is not None:
-            max_page_number = max(max_page_number, page_num)
+    # DTBook/OPF/NCX 메타데이터에 공통으로 쓰는 생성 날짜 (한 번만 계산)
+    today = datetime.now().strftime("%Y-%m-%d")
 
     dtbook_root = etree.Element(
         "{%s}dtbook" % dtbook_ns,
@@ -952,33 +982,21 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     # head 요소 추가
     head = etree.SubElement(dtbook_root, "head")
 
-    # 필수 메타데이터 추가
-    meta_uid = etree.SubElement(head, "meta",
-                                name="dtb:uid",
-                                content=book_uid)
-    meta_title = etree.SubElement(head, "meta",
-                                  name="dc:Title",
-                                  content=book_title)
-    meta_author = etree.SubElement(head, "meta",
-                                   name="dc:Creator",
-                                   content=book_author)
-    meta_publisher = etree.SubElement(head, "meta",
-                                   name="dc:Publisher",
-                                   content=book_publisher)
-    meta_language = etree.SubElement(head, "meta",
-                                     name="dc:Language",
-                                     content=book_language)
-    meta_date = etree.SubElement(head, "meta",
-                                 name="dc:Date",
-                                 content=datetime.now().strftime("%Y-%m-%d"))
-
-    # 페이지 관련 메타데이터 추가
-    etree.SubElement(head, "meta",
-                     name="dtb:totalPageCount",
-                     content=str(max_page_number))
-    etree.SubElement(head, "meta",
-                     name="dtb:maxPageNumber",
-                     content=str(max_page_number))
+    # 필수 메타데이터와 페이지 관련 메타데이터 (출력 순서대로)
+    meta_pairs = [
+        ("dtb:uid", book_uid),
+        ("dc:Title", book_title),
+        ("dc:Creator", book_author),
+        ("dc:Publisher", book_publisher),
+        ("dc:Language", book_language),
+        ("dc:Date", today),
+        ("dtb:totalPageCount", str(max_page_number)),
+        ("dtb:maxPageNumber", str(max_page_number)),
+    ]
+    for meta_name, meta_content in meta_pairs:
+        meta = etree.SubElement(head, "meta")
+        meta.set("name", meta_name)
+        meta.set("content", meta_content)
 
     # book 요소 추가
     dtbook_book = etree.SubElement(dtbook_root, "book", showin="blp")
@@ -1002,12 +1020,8 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     # bodymatter 추가
     dtbook_bodymatter = etree.SubElement(dtbook_book, "bodymatter")
 
-    # 현재 level1 요소
-    current_level1 = None
-    current_level = 0
-
     # 계층 구조 관리를 위한 변수들
-    level_elements = {}  # 각 레벨별 현재 요소를 추적
+    level_elements = {}  # 각 레벨별 현재 요소를 추적 (레벨 -> 열린 levelN 요소)
     current_level = 0
     
     # 콘텐츠 추가
@@ -1015,13 +1029,11 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
         if item["type"] == "pagenum":
             # 페이지 번호는 현재 활성 레벨 요소에 추가
             parent_elem = level_elements.get(current_level, dtbook_bodymatter)
-            pagenum = etree.SubElement(
-                parent_elem,
-                "pagenum",
-                id=f"page_{item['text']}_{item['text']}",
-                smilref=f"dtbook.smil#smil_par_page_{item['text']}_{item['text']}",
-                page="normal"
-            )
+            # 키워드 인자 대신 생성 후 set으로 속성 지정 (lxml에서 더 빠름, 속성 순서 동일)
+            pagenum = etree.SubElement(parent_elem, "pagenum")
+            pagenum.set("id", item["ref_id"])
+            pagenum.set("smilref", item["smilref"])
+            pagenum.set("page", "normal")
             pagenum.text = str(item["text"])
             continue
         elif item["type"] == "image":
@@ -1036,26 +1048,27 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                 current_level = 1
                 parent_elem = level1
 
-            # 이미지 그룹 생성
-            imggroup = etree.SubElement(parent_elem, "imggroup",
-                                      id=item["id"], class_="figure")
+            # 이미지 그룹 생성 (생성 후 set으로 속성 지정, 속성 순서 동일)
+            imggroup = etree.SubElement(parent_elem, "imggroup")
+            imggroup.set("id", item["id"])
+            imggroup.set("class_", "figure")
 
             # 이미지 요소 생성
-            img = etree.SubElement(imggroup, "img",
-                                 id=f"{item['id']}_img",
-                                 src=item["src"],
-                                 alt=item["alt_text"])
+            img = etree.SubElement(imggroup, "img")
+            img.set("id", f"{item['id']}_img")
+            img.set("src", item["src"])
+            img.set("alt", item["alt_text"])
             
             # 이미지 크기를 적절히 설정
             img.set("width", "60%")
             img.set("height", "auto")
             
             # 이미지 캡션 추가
-            caption = etree.SubElement(imggroup, "caption",
-                                     id=f"{item['id']}_caption")
-            sent = etree.SubElement(caption, "sent",
-                                  id=item["sent_id"],
-                                  smilref=f"dtbook.smil#smil_par_{item['sent_id']}")
+            caption = etree.SubElement(imggroup, "caption")
+            caption.set("id", f"{item['id']}_caption")
+            sent = etree.SubElement(caption, "sent")
+            sent.set("id", item["sent_id"])
+            sent.set("smilref", f"dtbook.smil#smil_par_{item['sent_id']}")
             
             continue
         elif item["type"] == "table":
@@ -1065,7 +1078,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                 # level1이 없는 경우 생성
                 level1 = etree.SubElement(dtbook_bodymatter, "level1",
                                         id=item["id"],
-                                        smilref=f"dtbook.smil#smil_par_{item['id']}")
+                                        smilref=item["smilref"])
                 h1 = etree.SubElement(level1, "h1")
                 h1.text = "제목 없음"
                 level_elements[1] = level1
@@ -1085,17 +1098,21 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
             # 재귀 렌더링 함수 (문단/표 순서 보존)
             def render_table_to_dtbook(parent_tbody, table_data_obj, base_id):
+                # (행, 열) -> 셀 정보 매핑 (셀마다 전체 셀 목록을 훑지 않도록, 첫 항목 우선)
+                cell_index = {}
+                for cell in table_data_obj["cells"]:
+                    cell_index.setdefault((cell["row"], cell["col"]), cell)
+
                 for row_idx, row_data in enumerate(table_data_obj["rows"]):
-                    tr = etree.SubElement(parent_tbody, "tr",
-                                          style="border: 3px double #000;")
+                    tr = etree.SubElement(parent_tbody, "tr")
+                    tr.set("style", "border: 3px double #000;")
                     for col_idx, _ in enumerate(row_data):
-                        cell_info = next((cell for cell in table_data_obj["cells"]
-                                          if cell["row"] == row_idx and cell["col"] == col_idx), None)
+                        cell_info = cell_index.get((row_idx, col_idx))
                         if cell_info and cell_info.get("is_merged_area", False):
                             continue
 
-                        cell_elem = etree.SubElement(tr, "td",
-                                                    style="text-align: left; vertical-align: middle; font-weight: normal; border: 3px double #000;")
+                        cell_elem = etree.SubElement(tr, "td")
+                        cell_elem.set("style", "text-align: left; vertical-align: middle; font-weight: normal; border: 3px double #000;")
 
                         if cell_info and cell_info["is_merged"]:
                             if cell_info["rowspan"] > 1:
@@ -1108,13 +1125,10 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                         for s_idx, s in enumerate(seq):
                             if s.get('type') == 'p':
                                 para_text = s.get('text', '')
-                                p = etree.SubElement(
-                                    cell_elem,
-                                    "p",
-                                    id=f"table_{base_id}_cell_{row_idx}_{col_idx}_p_{seq_para_counter}",
-                                    smilref=f"dtbook.smil#smil_par_{base_id}_cell_{row_idx}_{col_idx}_p_{seq_para_counter}",
-                                    style="margin: 0; padding: 8px; text-align: left; vertical-align: middle; font-weight: normal;"
-                                )
+                                p = etree.SubElement(cell_elem, "p")
+                                p.set("id", f"table_{base_id}_cell_{row_idx}_{col_idx}_p_{seq_para_counter}")
+                                p.set("smilref", f"dtbook.smil#smil_par_{base_id}_cell_{row_idx}_{col_idx}_p_{seq_para_counter}")
+                                p.set("style", "margin: 0; padding: 8px; text-align: left; vertical-align: middle; font-weight: normal;")
                                 if para_text.strip() == "<br/>":
                                     etree.SubElement(p, "br")
                                 elif para_text.strip():
@@ -1133,16 +1147,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                             for img_idx, img in enumerate(cell_info["images"]):
                                 nonlocal image_counter
                                 image_counter += 1
-                                image_ext = ".jpeg"
-                                try:
-                                    if 'image_rid' in img:
-                                        rel = image_relations.get(img['image_rid'])
-                                        if rel and hasattr(rel, 'target_ref'):
-                                            ext = os.path.splitext(rel.target_ref)[1]
-                                            if ext:
-                                                image_ext = ext
-                                except Exception:
-                                    pass
+                                image_ext = image_ext_map.get(img.get('image_rid'), ".jpeg")
 
                                 image_filename = f"table_{base_id}_cell_{row_idx}_{col_idx}_img_{img_idx}{image_ext}"
                                 image_path = os.path.join(output_dir, image_filename)
@@ -1167,16 +1172,16 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                             render_table_to_dtbook(nested_tbody, nested_table_data, nested_base_id)
 
             render_table_to_dtbook(tbody, table_data, item['id'])
-        elif item["type"].startswith("h"):
-            level = int(item["type"][1])  # h1 -> 1, h2 -> 2, h3 -> 3, h4 -> 4, h5 -> 5, h6 -> 6
+        elif item["level"]:
+            level = item["level"]  # h1 -> 1, h2 -> 2, h3 -> 3, h4 -> 4, h5 -> 5, h6 -> 6
 
             if level == 1:
                 # 새로운 level1 시작
                 level1 = etree.SubElement(dtbook_bodymatter, "level1",
                                         id=item["id"],
-                                        smilref=f"dtbook.smil#smil_par_{item['id']}")
+                                        smilref=item["smilref"])
                 h1 = etree.SubElement(level1, "h1")
-                h1.text = " ".join(item["words"])
+                h1.text = item["display_text"]
                 
                 # 레벨 요소 업데이트
                 level_elements[1] = level1
@@ -1193,7 +1198,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     # level1이 없는 경우 생성
                     level1 = etree.SubElement(dtbook_bodymatter, "level1",
                                             id=item["id"],
-                                            smilref=f"dtbook.smil#smil_par_{item['id']}")
+                                            smilref=item["smilref"])
                     h1 = etree.SubElement(level1, "h1")
                     h1.text = "제목 없음"
                     level_elements[1] = level1
@@ -1208,13 +1213,13 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     parent_elem = level_elements[1]
                 
                 # 새로운 level 요소 생성
-                new_level = etree.SubElement(parent_elem, f"level{level}",
+                new_level = etree.SubElement(parent_elem, LEVEL_CLASS_NAMES[level - 1],
                                            id=item["id"],
-                                           smilref=f"dtbook.smil#smil_par_{item['id']}")
+                                           smilref=item["smilref"])
                 
                 # 제목 요소 생성
-                heading = etree.SubElement(new_level, f"h{level}")
-                heading.text = " ".join(item["words"])
+                heading = etree.SubElement(new_level, HEADING_TAGS[level - 1])
+                heading.text = item["display_text"]
                 
                 # 레벨 요소 업데이트
                 level_elements[level] = new_level
@@ -1225,17 +1230,15 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     if l in level_elements:
                         del level_elements[l]
 
-            # 기타 마커 처리
-            for marker in item.get("markers", []):
-                if marker.type != "page":  # 페이지 마커는 이미 처리됨
-                    elem_info = MarkerProcessor.create_dtbook_element(marker)
-                    if elem_info:
-                        # 현재 레벨 요소에 마커 추가
-                        current_elem = level_elements.get(current_level, level_elements.get(1))
-                        marker_elem = etree.SubElement(current_elem,
-                                                     elem_info["tag"],
-                                                     attrib=elem_info["attrs"])
-                        marker_elem.text = elem_info["text"]
+            # 기타 마커 처리 (페이지 마커는 이미 처리됨)
+            for marker, elem_info, _ in item["marker_elements"]:
+                if elem_info:
+                    # 현재 레벨 요소에 마커 추가
+                    current_elem = level_elements.get(current_level, level_elements.get(1))
+                    marker_elem = etree.SubElement(current_elem,
+                                                 elem_info["tag"],
+                                                 attrib=elem_info["attrs"])
+                    marker_elem.text = elem_info["text"]
         else:
             # 일반 단락은 현재 활성 레벨 요소에 추가
             parent_elem = level_elements.get(current_level, dtbook_bodymatter)
@@ -1243,47 +1246,43 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                 # level1이 없는 경우 생성
                 level1 = etree.SubElement(dtbook_bodymatter, "level1",
                                         id=item["id"],
-                                        smilref=f"dtbook.smil#smil_par_{item['id']}")
+                                        smilref=item["smilref"])
                 h1 = etree.SubElement(level1, "h1")
                 h1.text = "제목 없음"
                 level_elements[1] = level1
                 current_level = 1
                 parent_elem = level1
 
-            p = etree.SubElement(parent_elem, "p",
-                               id=item["id"],
-                               smilref=f"dtbook.smil#smil_par_{item['id']}")
+            p = etree.SubElement(parent_elem, "p")
+            p.set("id", item["id"])
+            p.set("smilref", item["smilref"])
             
             # <br/> 태그가 포함된 경우 실제 br 요소로 생성
             if item.get("text", "") == "<br/>":
                 br_elem = etree.SubElement(p, "br")
             else:
-                p.text = " ".join(item["words"])
-
-            # 기타 마커 처리
-            for marker in item.get("markers", []):
-                if marker.type != "page":  # 페이지 마커는 이미 처리됨
-                    elem_info = MarkerProcessor.create_dtbook_element(marker)
-                    if elem_info:
-                        marker_elem = etree.SubElement(parent_elem,
-                                                     elem_info["tag"],
-                                                     attrib=elem_info["attrs"])
-                        marker_elem.text = elem_info["text"]
+                p.text = item["display_text"]
+
+            # 기타 마커 처리 (페이지 마커는 이미 처리됨)
+            for marker, elem_info, _ in item["marker_elements"]:
+                if elem_info:
+                    marker_elem = etree.SubElement(parent_elem,
+                                                 elem_info["tag"],
+                                                 attrib=elem_info["attrs"])
+                    marker_elem.text = elem_info["text"]
 
     # XML 파일 저장
     dtbook_filepath = os.path.join(output_dir, "dtbook.xml")
     tree = etree.ElementTree(dtbook_root)
 
-    # XML 선언에 인코딩 명시적 지정
-    with open(dtbook_filepath, 'wb') as f:
-        # XML 선언
-        f.write('<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'.encode('utf-8'))
-        # DTD 선언
-        f.write('<!DOCTYPE dtbook PUBLIC "-//NISO//DTD dtbook 2005-3//EN" "http://www.daisy.org/z3986/2005/dtbook-2005-3.dtd">\n'.encode('utf-8'))
+    # XML 선언에 인코딩 명시적 지정 (큰 버퍼로 열어 write 호출 횟수를 줄임)
+    with open(dtbook_filepath, 'wb', buffering=IO_BUFSIZE) as f:
+        # XML 선언 + DTD 선언
+        f.write(DTBOOK_XML_HEADER)
         # XML 트리 저장 - 명시적으로 인코딩 지정
         tree.write(f,
                   encoding='utf-8',
-                  pretty_print=True,
+                  pretty_print=PRETTY_PRINT_XML,
                   xml_declaration=False,
                   method='xml')
 
@@ -1322,7 +1321,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
     date_elem = etree.SubElement(
         dc_metadata, "{%s}Date" % dc_ns, nsmap={'dc': dc_ns})
-    date_elem.text = datetime.now().strftime("%Y-%m-%d")
+    date_elem.text = today
 
     publisher_elem = etree.SubElement(
         dc_metadata, "{%s}Publisher" % dc_ns, nsmap={'dc': dc_ns})
@@ -1391,57 +1390,32 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                      idref="mo")
 
     # OPF Manifest에 이미지 파일 추가
-    for item in content_structure:
-        if item["type"] == "image":
-            image_filename = os.path.basename(item["src"])
-            image_id = f"img_{item['id']}"
-            extension = os.path.splitext(image_filename)[1][1:].lower()
-
-            # 이미지 확장자에 따른 MIME 타입 설정
-            mime_type = {
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'png': 'image/png',
-                'gif': 'image/gif',
-                'bmp': 'image/bmp',
-                'tiff': 'image/tiff',
-                'tif': 'image/tiff'
-            }.get(extension, f'image/{extension}')
-
-            print(f"이미지 매니페스트 추가: {image_filename} (MIME: {mime_type})")
-            etree.SubElement(manifest, "item",
-                             href=item["src"],
-                             id=image_id,
-                             **{"media-type": mime_type})
+    for item in image_items:
+        # 이미지 src는 저장 시 만든 파일 이름 그대로이므로 basename을 다시 구하지 않음
+        image_filename = item["src"]
+        image_id = f"img_{item['id']}"
+        extension = os.path.splitext(image_filename)[1][1:].lower()
+
+        # 이미지 확장자에 따른 MIME 타입 설정
+        mime_type = IMAGE_MIME_TYPES.get(extension, f'image/{extension}')
+
+        logger.debug("이미지 매니페스트 추가: %s (MIME: %s)", image_filename, mime_type)
+        etree.SubElement(manifest, "item",
+                         href=item["src"],
+                         id=image_id,
+                         **{"media-type": mime_type})
     
     # 표 안의 이미지 파일들도 매니페스트에 추가 (중첩 표 재귀 지원)
     def add_table_images_to_manifest(table_data_obj, base_id):
         for cell in table_data_obj["cells"]:
             if cell.get("images"):
                 for img_idx, img in enumerate(cell["images"]):
-                    image_ext = ".jpeg"
-                    try:
-                        if 'image_rid' in img:
-                            rel = image_relations.get(img['image_rid'])
-                            if rel and hasattr(rel, 'target_ref'):
-                                ext = os.path.splitext(rel.target_ref)[1]
-                                if ext:
-                                    image_ext = ext
-                    except Exception:
-                        pass
+                    image_ext = image_ext_map.get(img.get('image_rid'), ".jpeg")
                     image_filename = f"table_{base_id}_cell_{cell['row']}_{cell['col']}_img_{img_idx}{image_ext}"
                     image_id = f"img_table_{base_id}_cell_{cell['row']}_{cell['col']}_{img_idx}"
                     extension = os.path.splitext(image_filename)[1][1:].lower()
-                    mime_type = {
-                        'jpg': 'image/jpeg',
-                        'jpeg': 'image/jpeg',
-                        'png': 'image/png',
-                        'gif': 'image/gif',
-                        'bmp': 'image/bmp',
-                        'tiff': 'image/tiff',
-                        'tif': 'image/tiff'
-                    }.get(extension, f'image/{extension}')
-                    print(f"표 안 이미지 매니페스트 추가: {image_filename} (MIME: {mime_type})")
+                    mime_type = IMAGE_MIME_TYPES.get(extension, f'image/{extension}')
+                    logger.debug("표 안 이미지 매니페스트 추가: %s (MIME: %s)", image_filename, mime_type)
                     etree.SubElement(manifest, "item",
                                      href=image_filename,
                                      id=image_id,
@@ -1453,20 +1427,18 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     nested_base_id = f"{base_id}_cell_{cell['row']}_{cell['col']}_nested_{s_idx}"
                     add_table_images_to_manifest(s.get('table_data', {}), nested_base_id)
 
-    for item in content_structure:
-        if item["type"] == "table":
-            add_table_images_to_manifest(item["table_data"], item['id'])
+    for item in table_items:
+        add_table_images_to_manifest(item["table_data"], item['id'])
 
     # OPF 파일 저장
     opf_filepath = os.path.join(output_dir, "dtbook.opf")
     tree = etree.ElementTree(opf_root)
 
-    with open(opf_filepath, 'wb') as f:
-        f.write('<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'.encode('utf-8'))
-        f.write('<!DOCTYPE package PUBLIC "+//ISBN 0-9673008-1-9//DTD OEB 1.2 Package//EN" "http://openebook.org/dtds/oeb-1.2/oebpkg12.dtd">\n'.encode('utf-8'))
+    with open(opf_filepath, 'wb', buffering=IO_BUFSIZE) as f:
+        f.write(OPF_XML_HEADER)
         tree.write(f,
                   encoding='utf-8',
-                  pretty_print=True,
+                  pretty_print=PRETTY_PRINT_XML,
                   xml_declaration=False,
                   method='xml')
 
@@ -1528,40 +1500,44 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
         # pagenum 타입은 이미 DTBook에서 처리되었으므로 SMIL에서만 처리
         if item["type"] == "pagenum":
             page_par = etree.SubElement(root_seq, "par",
-                                      id=f"smil_par_page_{item['text']}_{item['text']}",
+                                      id=item["smil_par_id"],
                                       **{"class": "pagenum"},
                                       customTest="pagenum")
             etree.SubElement(page_par, "text",
-                           src=f"dtbook.xml#page_{item['text']}_{item['text']}")
+                           src=item["text_src"])
             continue
 
         # 기본 콘텐츠
-        if item["type"].startswith("h"):
+        level = item["level"]  # h1 -> 1, ..., h6 -> 6, 제목이 아니면 0
+        if level:
             # 제목 요소일 경우 level로 처리
-            level = int(item["type"][1])  # h1 -> 1, h2 -> 2, h3 -> 3, h4 -> 4, h5 -> 5, h6 -> 6
             par = etree.SubElement(root_seq, "par",
-                                 id=f"smil_par_{item['id']}",
-                                 **{"class": f"level{level}"})
+                                 id=item["smil_par_id"],
+                                 **{"class": LEVEL_CLASS_NAMES[level - 1]})
             etree.SubElement(par, "text",
-                           src=f"dtbook.xml#{item['id']}")
+                           src=item["text_src"])
         else:
             # 일반 콘텐츠 처리 (table은 별도 처리하므로 건너뜀)
             if item["type"] != "table":
                 par = etree.SubElement(root_seq, "par",
-                                     id=f"smil_par_{item['id']}",
+                                     id=item["smil_par_id"],
                                      **{"class": item["type"]})
                 etree.SubElement(par, "text",
-                               src=f"dtbook.xml#{item['id']}")
+                               src=item["text_src"])
 
         # 표 처리
         if item["type"] == "table":
             table_data = item["table_data"]
 
             def render_table_to_smil(parent_seq, table_data_obj, base_id):
+                # (행, 열) -> 셀 정보 매핑 (셀마다 전체 셀 목록을 훑지 않도록, 첫 항목 우선)
+                cell_index = {}
+                for cell in table_data_obj["cells"]:
+                    cell_index.setdefault((cell["row"], cell["col"]), cell)
+
                 for row_idx, row_data in enumerate(table_data_obj["rows"]):
                     for col_idx, _ in enumerate(row_data):
-                        cell_info = next((cell for cell in table_data_obj["cells"]
-                                          if cell["row"] == row_idx and cell["col"] == col_idx), None)
+                        cell_info = cell_index.get((row_idx, col_idx))
                         if cell_info and cell_info.get("is_merged_area", False):
                             continue
 
@@ -1583,27 +1559,24 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
             render_table_to_smil(root_seq, table_data, item['id'])
 
-        # 마커 처리 (페이지 마커 제외)
-        for marker in item.get("markers", []):
-            if marker.type != "page":  # 페이지 마커는 이미 처리됨
-                elem_info = MarkerProcessor.create_smil_element(marker, item["id"])
-                if elem_info:
-                    marker_par = etree.SubElement(root_seq, "par",
-                                                id=f"smil_par_{item['id']}_{marker.type}",
-                                                **{"class": elem_info["par_class"]})
-                    etree.SubElement(marker_par, "text",
-                                   src=elem_info["text_src"])
+        # 마커 처리 (페이지 마커 제외, 미리 만든 SMIL 요소 정보 사용)
+        for marker, _, elem_info in item["marker_elements"]:
+            if elem_info:
+                marker_par = etree.SubElement(root_seq, "par",
+                                            id=f"smil_par_{item['id']}_{marker.type}",
+                                            **{"class": elem_info["par_class"]})
+                etree.SubElement(marker_par, "text",
+                               src=elem_info["text_src"])
 
     # SMIL 파일 저장
     smil_filepath = os.path.join(output_dir, "dtbook.smil")
     tree = etree.ElementTree(smil_root)
 
-    with open(smil_filepath, 'wb') as f:
-        f.write('<?xml version="1.0" encoding="utf-8" standalone="no"?>\n'.encode('utf-8'))
-        f.write('<!DOCTYPE smil PUBLIC "-//NISO//DTD dtbsmil 2005-2//EN" "http://www.daisy.org/z3986/2005/dtbsmil-2005-2.dtd">\n'.encode('utf-8'))
+    with open(smil_filepath, 'wb', buffering=IO_BUFSIZE) as f:
+        f.write(SMIL_XML_HEADER)
         tree.write(f,
                   encoding='utf-8',
-                  pretty_print=True,
+                  pretty_print=PRETTY_PRINT_XML,
                   xml_declaration=False,
                   method='xml')
 
@@ -1627,14 +1600,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
     # head
     head = etree.SubElement(ncx_root, "head")
-    # 최대 제목 레벨 계산 (dtb:depth 반영)
-    max_heading_level = 0
-    for _item in content_structure:
-        if isinstance(_item.get("type"), str) and _item["type"].startswith("h"):
-            try:
-                max_heading_level = max(max_heading_level, int(_item["type"][1]))
-            except Exception:
-                pass
+    # 최대 제목 레벨 (dtb:depth 반영, 구조 요소 분류 시 계산됨)
     if max_heading_level <= 0:
         max_heading_level = 1
 
@@ -1646,7 +1612,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                      content=book_title)
     etree.SubElement(head, "meta",
                      name="dc:Date",
-                     content=datetime.now().strftime("%Y-%m-%d"))
+                     content=today)
     etree.SubElement(head, "meta",
                      name="dc:Format",
                      content="ANSI/NISO Z39.86-2005")
@@ -1705,62 +1671,49 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
     # 목차 항목 생성 (제목만 포함, 표 제외)
     play_order = 1
-    level_stack = [None] * 7  # 1~6 사용
-
-    for item in content_structure:
-        if isinstance(item.get("type"), str) and item["type"].startswith("h"):
-            try:
-                level = int(item["type"][1])  # h1 -> 1, ..., h6 -> 6
-            except Exception:
-                continue
-
-            nav_point = etree.Element(
-                "navPoint",
-                id=f"ncx_{item['id']}",
-                **{"class": f"level{level}"},
-                playOrder=str(play_order)
-            )
-            nav_label = etree.SubElement(nav_point, "navLabel")
-            text = etree.SubElement(nav_label, "text")
-            label_text = item.get("text") or " ".join(item.get("words", [])) or "제목 없음"
-            text.text = label_text
-            etree.SubElement(nav_point, "content",
-                             src=f"dtbook.smil#smil_par_{item['id']}")
-
-            # 부모 찾기: 현재 레벨보다 작은 가장 가까운 상위 레벨
-            parent = None
-            for pl in range(level - 1, 0, -1):
-                if level_stack[pl] is not None:
-                    parent = level_stack[pl]
-                    break
-
-            if parent is None:
-                nav_map.append(nav_point)
-            else:
-                parent.append(nav_point)
+    level_points = [nav_map] + [None] * 6  # 0: navMap, 1~6: 레벨별 현재 navPoint
+
+    for item in heading_items:
+        level = item["level"]  # h1 -> 1, ..., h6 -> 6
+
+        # 부모 찾기: 현재 레벨보다 작은 가장 가까운 상위 레벨 (0번은 항상 navMap)
+        parent = next(p for p in reversed(level_points[:level]) if p is not None)
+
+        # 부모를 먼저 정하고 SubElement로 바로 생성 (Element 생성 후 append 하지 않음)
+        nav_point = etree.SubElement(
+            parent,
+            "navPoint",
+            id=f"ncx_{item['id']}",
+            **{"class": LEVEL_CLASS_NAMES[level - 1]},
+            playOrder=str(play_order)
+        )
+        nav_label = etree.SubElement(nav_point, "navLabel")
+        text = etree.SubElement(nav_label, "text")
+        label_text = item.get("text") or item.get("display_text") or "제목 없음"
+        text.text = label_text
+        etree.SubElement(nav_point, "content",
+                         src=item["smilref"])
 
-            # 스택 갱신
-            level_stack[level] = nav_point
-            for clr in range(level + 1, 7):
-                level_stack[clr] = None
+        # 스택 갱신 (더 깊은 레벨은 닫힘)
+        level_points[level] = nav_point
+        level_points[level + 1:] = [None] * (6 - level)
 
-            play_order += 1
+        play_order += 1
 
     # pageList (문서 내 '$#' 페이지 마커만을 순서대로 추가 - 표지 제외)
     page_targets = []
 
-    for item in content_structure:
-        if item.get("type") == "pagenum":
-            page_value = str(item.get("text", "")).strip()
-            if not page_value:
-                continue
-            page_targets.append({
-                "id": f"p{page_value}",
-                "value": page_value,
-                "type": "normal",
-                "play_order": play_order
-            })
-            play_order += 1
+    for item in pagenum_items:
+        page_value = str(item.get("text", "")).strip()
+        if not page_value:
+            continue
+        page_targets.append({
+            "id": f"p{page_value}",
+            "value": page_value,
+            "type": "normal",
+            "play_order": str(play_order)  # 속성값으로만 쓰이므로 문자열로 보관
+        })
+        play_order += 1
 
     if page_targets:
         page_list = etree.SubElement(ncx_root, "pageList", id="pages")
@@ -1774,7 +1727,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                                         **{"class": "pagenum"},
                                         type=page["type"],
                                         value=page["value"],
-                                        playOrder=str(page["play_order"]))
+                                        playOrder=page["play_order"])
             nav_label = etree.SubElement(nav_point, "navLabel")
             text = etree.SubElement(nav_label, "text")
             text.text = page["value"]
@@ -1783,7 +1736,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
 
     # navList (각주, 미주 등이 있는 경우 추가)
     note_targets = []
-    for item in content_structure:
+    for item in note_items:
         for marker in item.get("markers", []):
             if marker.type in ["note", "annotation"]:
                 note_targets.append({
@@ -1791,7 +1744,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
                     "text": marker.text,
                     "smil_file": item["smil_file"],
                     "item_id": item["id"],
-                    "play_order": play_order
+                    "play_order": str(play_order)
                 })
                 play_order += 1
 
@@ -1804,7 +1757,7 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
         for note in note_targets:
             nav_target = etree.SubElement(nav_list, "navTarget",
                                          id=note["id"],
-                                         playOrder=str(note["play_order"]))
+                                         playOrder=note["play_order"])
             nav_label = etree.SubElement(nav_target, "navLabel")
             text = etree.SubElement(nav_label, "text")
             text.text = note["text"]
@@ -1815,11 +1768,10 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     ncx_filepath = os.path.join(output_dir, "dtbook.ncx")
     tree = etree.ElementTree(ncx_root)
 
-    with open(ncx_filepath, 'wb') as f:
-        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        f.write(b'<!DOCTYPE ncx PUBLIC "-//NISO//DTD ncx 2005-1//EN" "http://www.daisy.org/z3986/2005/ncx-2005-1.dtd" >\n')
+    with open(ncx_filepath, 'wb', buffering=IO_BUFSIZE) as f:
+        f.write(NCX_XML_HEADER)
         tree.write(f,
-                   pretty_print=True,
+                   pretty_print=PRETTY_PRINT_XML,
                    encoding='utf-8',
                    xml_declaration=False)
 
@@ -1888,11 +1840,10 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     res_filepath = os.path.join(output_dir, "dtbook.res")
     tree = etree.ElementTree(res_root)
 
-    with open(res_filepath, 'wb') as f:
-        f.write(b'<?xml version="1.0" encoding="utf-8"?>\n')
-        f.write(b'<!DOCTYPE resources\n  PUBLIC "-//NISO//DTD resource 2005-1//EN" "http://www.daisy.org/z3986/2005/resource-2005-1.dtd">\n')
+    with open(res_filepath, 'wb', buffering=IO_BUFSIZE) as f:
+        f.write(RES_XML_HEADER)
         tree.write(f,
-                   pretty_print=True,
+                   pretty_print=PRETTY_PRINT_XML,
                    encoding='utf-8',
                    xml_declaration=False)
 
@@ -1905,9 +1856,8 @@ def create_daisy_book(docx_file_path, output_dir, book_title=None, book_author=N
     print("      오디오, SMIL 동기화, 목록, 표, 이미지, 페이지 번호 등은 포함하지 않습니다.")
 
     # 최종 메모리 정리 (모든 DAISY 파일 생성 완료 후)
-    if 'image_relations' in locals():
-        del image_relations
-    gc.collect()
+    if 'image_ext_map' in locals():
+        del image_ext_map
 
     # 타이밍 반환 (상위 호출자 기록용)
     return timings
@@ -1971,7 +1921,7 @@ def create_daisy_book_with_validation(docx_file_path, output_dir, book_title=Non
         raise e
 
 
-def zip_daisy_output(source_dir, output_zip_filename):
+def zip_daisy_output(source_dir, output_zip_filename, compresslevel=6):
 
     """
     지정된 폴더의 내용을 ZIP 파일로 압축합니다.
@@ -1979,6 +1929,8 @@ def zip_daisy_output(source_dir, output_zip_filename):
     Args:
         source_dir (str): 압축할 DAISY 파일들이 있는 폴더 경로.
         output_zip_filename (str): 생성될 ZIP 파일의 이름 (경로 포함 가능).
+        compresslevel (int, optional): DEFLATE로 압축하는 항목(XML 등)의 압축 레벨.
+            이미 압축된 이미지/오디오는 ZIP_STORED로 저장합니다. 기본값은 6
     """
     if not os.path.isdir(source_dir):
         print(f"오류: 소스 디렉토리를 찾을 수 없습니다 - {source_dir}")
@@ -1986,18 +1938,25 @@ def zip_daisy_output(source_dir, output_zip_filename):
 
     try:
         print(f"'{source_dir}' 폴더를 '{output_zip_filename}' 파일로 압축 중...")
-        # ZIP 파일 쓰기 모드로 열기 (압축 사용)
-        with zipfile.ZipFile(output_zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # source_dir 내부의 모든 파일과 폴더를 순회
-            for root, dirs, files in os.walk(source_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # ZIP 파일 내부에 저장될 상대 경로 계산
-                    # (source_dir 자체를 포함하지 않도록 함)
-                    archive_name = os.path.relpath(file_path, source_dir)
-                    print(f"  추가 중: {archive_name}")
-                    zipf.write(file_path, arcname=archive_name)
-        print(f"ZIP 파일 생성 완료: {output_zip_filename}")
+        # ZIP 파일 쓰기 모드로 열기 (압축 사용, 출력은 큰 버퍼로 모아서 씀)
+        with open(output_zip_filename, 'wb', buffering=ZIP_OUTPUT_BUFSIZE) as zip_out, \
+                zipfile.ZipFile(zip_out, 'w', zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as zipf:
+            # 복사 버퍼는 아카이브 전체에서 하나만 사용
+            copy_view = memoryview(bytearray(IO_BUFSIZE))
+            # 항목별 로그는 디버그 레벨일 때만 남기고, 완료 시 항목 수만 출력 (성능 최적화)
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            entry_count = 0
+            # source_dir 내부의 모든 파일을 (전체 경로, ZIP 내부 상대 경로)로 순회
+            # (상대 경로는 순회 중 접두사로 만들어지므로 파일마다 relpath/join을 호출하지 않음)
+            for file_path, archive_name in iter_relative_files(source_dir):
+                if debug_enabled:
+                    logger.debug("  추가 중: %s", archive_name)
+                # JPEG/PNG 등 이미 압축된 형식은 재압축하지 않고 저장
+                ext = os.path.splitext(archive_name)[1].lower()
+                compress_type = zipfile.ZIP_STORED if ext in PRECOMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                stream_file_to_zip(zipf, file_path, archive_name, compress_type, copy_view)
+                entry_count += 1
+        print(f"ZIP 파일 생성 완료: {output_zip_filename} ({entry_count}개 파일)")
     except Exception as e:
         print(f"ZIP 파일 생성 중 오류 발생: {e}")
 
@@ -9,13 +9,16 @@ from docx import Document  # python-docx 라이브러리
 from lxml import etree  # lxml 라이브러리
 from datetime import datetime
 from docx_to_daisy.markers import MarkerProcessor  # 마커 처리기 임포트
-import gc
-from docx_to_daisy.converter.utils import find_all_images, split_text_to_words, analyze_image_context, html_escape
+from docx_to_daisy.converter.utils import find_all_images, analyze_image_context, html_escape, BR_PATTERN, TABLE_TITLE_PATTERN, IMAGE_MIME_TYPES
 
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 스타일 이름 -> (요소 타입, 레벨) 판별 규칙 (성능 최적화)
+# 'heading N'으로 시작하거나 '제목 N'과 같으면 hN, 앞의 규칙이 우선
+HEADING_STYLE_RULES = tuple((f"heading {i}", f"제목 {i}", f"h{i}", i) for i in range(1, 7))
+
 
 def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=None, book_publisher=None, book_language="ko", book_isbn="NOT_GIVEN_ISBN"):
     """DOCX 파일을 EPUB3 형식으로 변환합니다 (TTAK.KO-10.0905 표준 준수).
@@ -72,29 +75,30 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
     body_children = list(document._element.body.iterchildren())
     element_index = {id(child): idx for idx, child in enumerate(body_children)}
 
+    # document.paragraphs는 접근할 때마다 Paragraph 목록을 새로 만들므로
+    # 한 번만 구해서 이미지 탐색, 단락 처리, 표 위치 계산에 재사용
+    paragraphs = document.paragraphs
+    total_paragraphs = len(paragraphs)
+
     # 1. 문서에서 모든 이미지 찾기
     print("문서에서 이미지 찾는 중...")
-    images = find_all_images(document)
+    images = find_all_images(document, paragraphs)
     print(f"총 {len(images)}개의 이미지 발견")
     
     # 2. 문서에서 모든 이미지 추출
     print(f"문서에서 이미지 추출 중...")
     image_counter = 0
-    image_relations = []
-    
-    # 모든 이미지 관계 수집
+
+    # 이미지 관계별 파일 확장자를 rId -> 확장자 딕셔너리로 미리 계산 (성능 최적화)
+    image_ext_map = {}
     for rel_id, rel in document.part.rels.items():
-        if "image" in rel.reltype:
-            try:
-                image_relations.append(rel)
-                print(f"이미지 관계 발견: {rel_id}, {rel.reltype}")
-            except Exception as e:
-                print(f"이미지 관계 처리 오류: {str(e)}")
-    
-    print(f"문서에서 {len(image_relations)}개의 이미지 관계 발견")
-    
-    # 이미지 매핑 정보 초기화
-    image_mapping = {}
+        if "image" in rel.reltype and hasattr(rel, 'target_ref'):
+            image_ext_map[rel_id] = os.path.splitext(rel.target_ref)[1] or ".jpeg"
+
+    # 이미지 디렉토리는 루프 밖에서 한 번만 생성
+    image_dir = os.path.join(output_dir, "images")
+    if images:
+        os.makedirs(image_dir, exist_ok=True)
 
     # 이미지 처리 (G38, G39, G41, G42 지침 준수)
     for i, img in enumerate(images, 1):
@@ -108,21 +112,10 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
             elem_id = f"img_{element_counter}"
             sent_id = f"sent_{sent_counter}"
             
-            # 이미지 파일 저장
-            image_ext = ".jpeg"
-            try:
-                if 'image_rid' in img:
-                    rel = document.part.rels[img['image_rid']]
-                    if hasattr(rel, 'target_ref'):
-                        ext = os.path.splitext(rel.target_ref)[1]
-                        if ext:
-                            image_ext = ext
-            except:
-                pass
+            # 이미지 파일 저장 (미리 계산한 확장자 사용)
+            image_ext = image_ext_map.get(img.get('image_rid'), ".jpeg")
             
             image_filename = f"images/image{img_num}{image_ext}"
-            image_dir = os.path.join(output_dir, "images")
-            os.makedirs(image_dir, exist_ok=True)
             image_path = os.path.join(output_dir, image_filename)
             
             # 이미지 데이터 저장
@@ -152,25 +145,37 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
 
     # 메모리 정리
     del images
-    del image_relations
-    del image_mapping
-    gc.collect()
 
     # DOCX의 단락(paragraph)을 순회하며 구조 파악
     print("DOCX 파일 분석 중...")
-    print(f"총 {len(document.paragraphs)}개의 단락을 처리합니다.")
+    print(f"총 {total_paragraphs}개의 단락을 처리합니다.")
+    
+    # 스타일 ID -> (요소 타입, 레벨) 캐시: 같은 스타일의 단락은 스타일 조회/비교를 다시 하지 않음
+    style_type_cache = {}
     
     # 단락 처리
-    for para_idx, para in enumerate(document.paragraphs):
+    for para_idx, para in enumerate(paragraphs):
         # 진행 상황 로그 (100개 단락마다)
         if para_idx % 100 == 0:
-            print(f"단락 처리 진행 중: {para_idx}/{len(document.paragraphs)} ({para_idx/len(document.paragraphs)*100:.1f}%)")
+            print(f"단락 처리 진행 중: {para_idx}/{total_paragraphs} ({para_idx/total_paragraphs*100:.1f}%)")
         
         text_raw = para.text
-        style_name = para.style.name.lower()
-
-        # <br/> 또는 <hs/> 태그 기준으로 세그먼트를 분리
-        br_segments = re.split(r'<(?:br|hs)\s*/?>', text_raw, flags=re.IGNORECASE)
+        
+        # 스타일 이름에 따른 구조 매핑 (G23, G24, G25 지침 준수)
+        style_id = para._p.style
+        style_info = style_type_cache.get(style_id)
+        if style_info is None:
+            style_name = para.style.name.lower()
+            style_info = ("p", 0)
+            for heading_prefix, korean_name, element_type, level_num in HEADING_STYLE_RULES:
+                if style_name.startswith(heading_prefix) or style_name == korean_name:
+                    style_info = (element_type, level_num)
+                    break
+            style_type_cache[style_id] = style_info
+        element_type, element_level = style_info
+
+        # <br/> 또는 <hs/> 태그 기준으로 세그먼트를 분리 (태그가 없으면 정규식 생략)
+        br_segments = BR_PATTERN.split(text_raw) if '<' in text_raw else (text_raw,)
 
         # 세그먼트별 처리
         for seg_idx, seg_text in enumerate(br_segments):
@@ -227,29 +232,12 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
             elem_id = f"p_{element_counter}"
             sent_id = f"sent_{sent_counter}"
 
-            # 단어 분리
-            words = split_text_to_words(processed_text)
-
-            # 스타일 이름에 따른 구조 매핑 (G23, G24, G25 지침 준수)
             content_structure.append({
-                "type": "h1" if style_name.startswith('heading 1') or style_name == '제목 1' else
-                "h2" if style_name.startswith('heading 2') or style_name == '제목 2' else
-                "h3" if style_name.startswith('heading 3') or style_name == '제목 3' else
-                "h4" if style_name.startswith('heading 4') or style_name == '제목 4' else
-                "h5" if style_name.startswith('heading 5') or style_name == '제목 5' else
-                "h6" if style_name.startswith('heading 6') or style_name == '제목 6' else
-                "p",
+                "type": element_type,
                 "text": processed_text,
-                "words": words,
                 "id": elem_id,
                 "sent_id": sent_id,
-                "level": 1 if style_name.startswith('heading 1') or style_name == '제목 1' else
-                        2 if style_name.startswith('heading 2') or style_name == '제목 2' else
-                        3 if style_name.startswith('heading 3') or style_name == '제목 3' else
-                        4 if style_name.startswith('heading 4') or style_name == '제목 4' else
-                        5 if style_name.startswith('heading 5') or style_name == '제목 5' else
-                        6 if style_name.startswith('heading 6') or style_name == '제목 6' else
-                        0,
+                "level": element_level,
                 "markers": markers,
                 "position": para_idx,
                 "insert_before": False
@@ -260,6 +248,15 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
     # 표 처리 (G31-G37 지침 준수)
     print("표 처리 중...")
     
+    # 표마다 body 앞부분을 다시 세지 않도록 각 표 앞의 단락 수를 한 번에 계산 (성능 최적화)
+    paragraphs_before_table = {}
+    paragraph_count = 0
+    for child in body_children:
+        if child.tag.endswith('p'):
+            paragraph_count += 1
+        elif child.tag.endswith('tbl'):
+            paragraphs_before_table[id(child)] = paragraph_count
+    
     if len(document.tables) > 0:
         print(f"문서에 {len(document.tables)}개의 표 발견")
         
@@ -277,11 +274,21 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
                 "cells": []
             }
             
+            # row.cells는 접근할 때마다 셀 객체를 새로 만들므로 행마다 한 번만 구함 (성능 최적화)
+            # 병합 범위 확인도 아래 목록을 재사용하여 행/열을 다시 만들지 않음
+            row_cells_list = [row.cells for row in table.rows]
+            # 가로/세로 병합으로 같은 셀이 여러 칸에 반복되므로 셀 텍스트는 셀당 한 번만 계산
+            cell_text_cache = {}
+
             # 행과 열 정보 추출
-            for row_idx, row in enumerate(table.rows):
+            for row_idx, row_cells in enumerate(row_cells_list):
                 row_data = []
-                for col_idx, cell in enumerate(row.cells):
-                    cell_text = " ".join(para.text for para in cell.paragraphs)
+                for col_idx, cell in enumerate(row_cells):
+                    cell_key = id(cell._tc)
+                    cell_text = cell_text_cache.get(cell_key)
+                    if cell_text is None:
+                        cell_text = " ".join(para.text for para in cell.paragraphs)
+                        cell_text_cache[cell_key] = cell_text
                     row_data.append(cell_text)
                     
                     # 셀 병합 정보 확인
@@ -292,9 +299,10 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
                     if hasattr(cell, '_tc') and hasattr(cell._tc, 'vMerge'):
                         if cell._tc.vMerge == 'restart':
                             is_merged_cell = True
-                            for next_row_idx in range(row_idx + 1, len(table.rows)):
-                                if col_idx < len(table.rows[next_row_idx].cells):
-                                    next_cell = table.rows[next_row_idx].cells[col_idx]
+                            for next_row_idx in range(row_idx + 1, len(row_cells_list)):
+                                next_row_cells = row_cells_list[next_row_idx]
+                                if col_idx < len(next_row_cells):
+                                    next_cell = next_row_cells[col_idx]
                                     if (hasattr(next_cell, '_tc') and hasattr(next_cell._tc, 'vMerge') and 
                                         next_cell._tc.vMerge == 'continue'):
                                         rowspan += 1
@@ -310,8 +318,8 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
                         if cell._tc.hMerge == 'restart':
                             is_merged_cell = True
                             colspan = 1
-                            for next_col_idx in range(col_idx + 1, len(row.cells)):
-                                next_cell = row.cells[next_col_idx]
+                            for next_col_idx in range(col_idx + 1, len(row_cells)):
+                                next_cell = row_cells[next_col_idx]
                                 if (hasattr(next_cell, '_tc') and hasattr(next_cell._tc, 'hMerge') and 
                                     next_cell._tc.hMerge == 'continue'):
                                     colspan += 1
@@ -332,53 +340,36 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
                 
                 table_data["rows"].append(row_data)
             
-            # 열 정보 추출
+            # 열 정보 추출 (행 데이터에서 파생: 셀 텍스트를 다시 계산하지 않음)
             for col_idx in range(len(table.columns)):
-                col_data = []
-                for row in table.rows:
-                    if col_idx < len(row.cells):
-                        cell_text = " ".join(para.text for para in row.cells[col_idx].paragraphs)
-                        col_data.append(cell_text)
-                table_data["cols"].append(col_data)
+                table_data["cols"].append([row_data[col_idx] for row_data in table_data["rows"] if col_idx < len(row_data)])
             
             # 표의 실제 위치를 찾기
-            table_position_body = len(document.paragraphs)
+            table_position_body = total_paragraphs
             try:
-                body_element = document._element.body
-                all_elements = list(body_element.iterchildren())
-                
-                table_element_index = -1
-                for idx, element in enumerate(all_elements):
-                    if element is table._element:
-                        table_element_index = idx
-                        break
+                # 미리 계산한 body 요소 위치 맵 사용 (표마다 body 목록을 다시 만들지 않음)
+                table_element_index = element_index.get(id(table._element), -1)
                         
                 if table_element_index != -1:
-                    paragraph_count_before_table = 0
-                    for idx in range(table_element_index):
-                        element = all_elements[idx]
-                        if element.tag.endswith('p'):
-                            paragraph_count_before_table += 1
-                    
-                    table_position_body = paragraph_count_before_table
+                    table_position_body = paragraphs_before_table[id(table._element)]
                     print(f"표 {table_idx} 정확한 위치 발견: {table_position_body}")
                 else:
-                    for para_idx, para in enumerate(document.paragraphs):
+                    for para_idx, para in enumerate(paragraphs):
                         para_text = para.text.strip()
-                        if re.search(r'\[?표\s*\d+\.?\d*\]?', para_text, re.IGNORECASE):
+                        if TABLE_TITLE_PATTERN.search(para_text):
                             table_position_body = para_idx + 0.5
                             print(f"표 {table_idx} 제목 패턴 위치 발견: {para_idx + 0.5}")
                             break
                     
-                    if table_position_body == len(document.paragraphs):
-                        table_position_body = len(document.paragraphs) - 1
+                    if table_position_body == total_paragraphs:
+                        table_position_body = total_paragraphs - 1
                         print(f"표 {table_idx} 마지막 위치 사용: {table_position_body}")
                 
                 print(f"표 {table_idx} 최종 위치: {table_position_body}")
                     
             except Exception as e:
                 print(f"표 위치 계산 중 오류: {e}")
-                table_position_body = len(document.paragraphs) - 1
+                table_position_body = total_paragraphs - 1
             
             table_title = f"표 {table_idx}"
             
@@ -401,9 +392,6 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
     else:
         print("문서에 표가 없습니다.")
 
-    # 메모리 정리
-    gc.collect()
-
     # 콘텐츠를 위치에 따라 정렬
     content_structure.sort(key=lambda x: (x["position"], 
                                          x.get("image_number", float('inf')) if x["type"] == "image" else 0, 
@@ -457,15 +445,7 @@ def create_epub3_book(docx_file_path, output_dir, book_title=None, book_author=N
             image_id = f"img_{item['id']}"
             extension = os.path.splitext(image_filename)[1][1:].lower()
             
-            mime_type = {
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'png': 'image/png',
-                'gif': 'image/gif',
-                'bmp': 'image/bmp',
-                'tiff': 'image/tiff',
-                'tif': 'image/tiff'
-            }.get(extension, f'image/{extension}')
+            mime_type = IMAGE_MIME_TYPES.get(extension, f'image/{extension}')
             
             manifest_items.append(f'<item id="{image_id}" href="{item["src"]}" media-type="{mime_type}"/>')
     
@@ -20,9 +20,72 @@ logger = logging.getLogger(__name__)
 BR_PATTERN = re.compile(r'<(?:br|hs)\s*/?>', flags=re.IGNORECASE)
 HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
 PUNCTUATION_PATTERN = re.compile(r'[.。,，!！?？:：;；]')
+LEADING_PUNCTUATION_PATTERN = re.compile(r'([.。,，!！?？:：;；]+)(.+)')
 BRACKET_PATTERN = re.compile(r'\[(.*?)\]')
 TABLE_TITLE_PATTERN = re.compile(r'\[?표\s*\d+\.?\d*\]?', re.IGNORECASE)
 
+# 이미지 확장자(점 제외, 소문자) -> MIME 타입 (매니페스트 작성 시 매번 딕셔너리를 만들지 않도록 모듈 수준에 둠)
+IMAGE_MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'tiff': 'image/tiff',
+    'tif': 'image/tiff'
+}
+
+# 파일 쓰기 및 이미지 등 디스크 파일을 ZIP에 스트리밍할 때 쓰는 버퍼 크기 (1 MiB)
+IO_BUFSIZE = 1 << 20
+# ZIP 출력 파일의 쓰기 버퍼 크기 (4 MiB): 작은 항목의 헤더/데이터 쓰기를 모아서 내보냄
+ZIP_OUTPUT_BUFSIZE = 4 << 20
+
+# 이미 압축된 형식은 DEFLATE 이득이 거의 없으므로 ZIP_STORED로 저장
+PRECOMPRESSED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.mp3', '.ogg', '.m4a', '.epub', '.zip'}
+
+
+def stream_file_to_zip(zipf, src_path, arcname, compress_type=None, buffer_view=None):
+    """디스크 파일을 1 MiB 버퍼로 읽어 ZIP 항목에 바로 씁니다.
+
+    ZipFile.write는 8 KiB 단위로 복사하므로 큰 이미지에서는 호출 횟수가 많아집니다.
+    하나의 버퍼를 readinto로 재사용하여 복사 중 추가 할당이 없도록 합니다.
+    compress_type을 주지 않으면 ZIP 파일의 기본 압축 방식을 따릅니다.
+    여러 파일을 연속으로 추가할 때는 buffer_view(bytearray의 memoryview)를 넘겨
+    파일마다 1 MiB 버퍼를 새로 할당하지 않도록 합니다.
+    """
+    zinfo = zipfile.ZipInfo.from_file(src_path, arcname)
+    zinfo.compress_type = zipf.compression if compress_type is None else compress_type
+    # ZipFile.write와 같은 방식으로 ZIP 파일의 압축 레벨을 항목에 적용
+    # (Python 3.13부터는 공개 속성 compress_level, 이전 버전은 _compresslevel만 있음)
+    if hasattr(zinfo, 'compress_level'):
+        zinfo.compress_level = zipf.compresslevel
+    else:
+        zinfo._compresslevel = zipf.compresslevel
+    view = memoryview(bytearray(IO_BUFSIZE)) if buffer_view is None else buffer_view
+    with open(src_path, 'rb', buffering=0) as src:
+        # 첫 블록을 먼저 읽어 두어, 읽을 수 없는 파일이면 ZIP 항목이 만들어지기 전에 실패하도록 함
+        n = src.readinto(view)
+        with zipf.open(zinfo, 'w') as dst:
+            while n:
+                dst.write(view[:n])
+                n = src.readinto(view)
+
+def iter_relative_files(base_dir):
+    """base_dir 아래의 모든 파일을 (전체 경로, ZIP 내부 경로) 쌍으로 돌려줍니다.
+
+    os.walk + relpath 대신 scandir 스택을 사용하고, 상대 경로 접두사를 함께 들고 다니므로
+    파일마다 경로 정규화가 필요 없습니다. ZIP 내부 경로는 항상 forward slash를 사용합니다.
+    """
+    stack = [("", base_dir)]
+    while stack:
+        rel_prefix, dir_path = stack.pop()
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((rel_prefix + entry.name + "/", entry.path))
+                elif entry.is_file():
+                    yield entry.path, rel_prefix + entry.name
+
 
 def html_escape(text):
     """HTML 특수 문자를 이스케이프하고 HTML 태그를 제거하는 함수
@@ -61,42 +124,34 @@ def split_text_to_words(text):
     Returns:
         list: 분리된 단어들의 리스트
     """
-    # <br/> 태그 제거
-    text = BR_PATTERN.sub(' ', text)
-    
-    # 문장 부호 패턴 정의
-    punctuation_pattern = r'[.。,，!！?？:：;；]'
+    # <br/> 태그 제거 (태그가 없으면 정규식 생략)
+    if '<' in text:
+        text = BR_PATTERN.sub(' ', text)
 
     # 1. 먼저 공백으로 단어들을 분리
-    words = text.strip().split()
+    words = text.split()
 
     result = []
+    append = result.append
     for word in words:
-        # 문장 부호가 없는 경우 그대로 반환
-        if not PUNCTUATION_PATTERN.search(word):
-            result.append(word)
-            continue
-
         # 문장 부호로 시작하는 경우만 분리
-        start_match = re.match(r'^([.。,，!！?？:：;；]+)(.+)$', word)
+        # (문장 부호가 없거나 끝/중간에 있는 경우는 원형 유지)
+        start_match = LEADING_PUNCTUATION_PATTERN.fullmatch(word)
         if start_match:
-            result.append(start_match.group(1))
-            result.append(start_match.group(2))
-            continue
-
-        # 문장 부호가 단어 끝에 있는 경우는 변경하지 않고 그대로 둠
-        if re.search(r'[.。,，!！?？:：;；]+$', word):
-            result.append(word)
-            continue
-
-        # 그 외(문장 부호가 단어 중간에 있는 경우)는 원형 유지
-        result.append(word)
+            append(start_match.group(1))
+            append(start_match.group(2))
+        else:
+            append(word)
 
     return result
 
 
-def find_all_images(document):
-    """문서에서 모든 이미지와 그 위치를 찾습니다."""
+def find_all_images(document, paragraphs=None):
+    """문서에서 모든 이미지와 그 위치를 찾습니다.
+
+    호출 측에서 이미 구한 document.paragraphs 목록이 있으면 paragraphs로 넘겨
+    단락 목록을 다시 만들지 않도록 합니다.
+    """
     images = []
     # Word 문서의 네임스페이스 정의
     nsmap = {
@@ -111,7 +166,10 @@ def find_all_images(document):
     # 네임스페이스 포함 XPath를 사전 컴파일 (호출 시 namespaces 키워드 사용 회피)
     blip_xpath = etree.XPath('.//a:blip/@r:embed | .//v:imagedata/@r:embed', namespaces=nsmap)
 
-    for para_idx, para in enumerate(document.paragraphs):
+    if paragraphs is None:
+        paragraphs = document.paragraphs
+
+    for para_idx, para in enumerate(paragraphs):
         for run_idx, run in enumerate(para.runs):
             # a:blip 또는 v:imagedata의 r:embed를 추출 (사전 컴파일된 XPath 사용)
             rids = blip_xpath(run._element)
@@ -142,15 +200,18 @@ def analyze_image_context(document, image_info, window_size=2):
     # 이미지가 있는 단락의 전체 텍스트
     current_para_text = para.text
     
+    # document.paragraphs는 접근할 때마다 목록을 새로 만들므로 한 번만 구함
+    paragraphs = document.paragraphs
+    
     # 이전 단락들의 텍스트 (window_size개)
     previous_paras = []
     for i in range(max(0, para_idx - window_size), para_idx):
-        previous_paras.append(document.paragraphs[i].text)
+        previous_paras.append(paragraphs[i].text)
     
     # 이후 단락들의 텍스트 (window_size개)
     next_paras = []
-    for i in range(para_idx + 1, min(len(document.paragraphs), para_idx + window_size + 1)):
-        next_paras.append(document.paragraphs[i].text)
+    for i in range(para_idx + 1, min(len(paragraphs), para_idx + window_size + 1)):
+        next_paras.append(paragraphs[i].text)
     
     # 이미지 설명 패턴 찾기
     # 1. 대괄호로 둘러싸인 텍스트 찾기
@@ -437,7 +437,8 @@ def process_daisy_to_epub_task(zip_file_path, output_path, title=None, author=No
             book_title=title,
             book_author=author,
             book_publisher=publisher,
-            book_language=language
+            book_language=language,
+            write_expanded=False
         )
         
         # 생성된 EPUB 파일을 최종 출력 경로로 복사
@@ -597,6 +598,7 @@ def process_docx_to_daisy_and_epub_task(
             book_author=author,
             book_publisher=publisher,
             book_language=language,
+            write_expanded=False,
         )
 
         # 결과 EPUB 파일 확정 및 복사
@@ -0,0 +1,98 @@
+"""daisyToepub 스트리밍 변환의 NCX 순서/참조 회귀 테스트.
+
+NCX navPoint가 DTBook 문서 순서와 다르게(중복, 이미 변환된 level1 내부 요소, 역순) 가리켜도
+level1 navPoint마다 섹션 XHTML이 빠짐없이 만들어지는지 확인합니다.
+"""
+import os
+
+import pytest
+from lxml import etree
+
+from docx_to_daisy.converter.daisyToepub import create_epub3_from_daisy
+
+DTBOOK_NS = "http://www.daisy.org/z3986/2005/dtbook/"
+NCX_NS = "http://www.daisy.org/z3986/2005/ncx/"
+
+# (level1 id, 제목, 본문 단락 id, 본문)
+SECTIONS = [
+    ("sec_1", "첫째 장", "p_1", "첫째 장 본문"),
+    ("sec_2", "둘째 장", "p_2", "둘째 장 본문"),
+    ("sec_3", "셋째 장", "p_3", "셋째 장 본문"),
+]
+
+
+def write_daisy_dir(daisy_dir, nav_targets):
+    """세 개의 level1을 가진 DTBook과 nav_targets 순서의 level1 navPoint를 가진 NCX를 기록합니다."""
+    dtbook = etree.Element(f"{{{DTBOOK_NS}}}dtbook", nsmap={None: DTBOOK_NS})
+    head = etree.SubElement(dtbook, f"{{{DTBOOK_NS}}}head")
+    for name, content in (("dtb:uid", "test-uid"), ("dc:Title", "테스트 책"), ("dc:Language", "ko")):
+        etree.SubElement(head, f"{{{DTBOOK_NS}}}meta", name=name, content=content)
+    book = etree.SubElement(dtbook, f"{{{DTBOOK_NS}}}book")
+    bodymatter = etree.SubElement(book, f"{{{DTBOOK_NS}}}bodymatter")
+    for level_id, heading, p_id, text in SECTIONS:
+        level1 = etree.SubElement(bodymatter, f"{{{DTBOOK_NS}}}level1", id=level_id)
+        etree.SubElement(level1, f"{{{DTBOOK_NS}}}h1", id=f"h_{level_id}").text = heading
+        etree.SubElement(level1, f"{{{DTBOOK_NS}}}p", id=p_id).text = text
+    etree.ElementTree(dtbook).write(os.path.join(daisy_dir, "dtbook.xml"), xml_declaration=True, encoding="utf-8")
+
+    ncx = etree.Element(f"{{{NCX_NS}}}ncx", nsmap={None: NCX_NS})
+    navmap = etree.SubElement(ncx, f"{{{NCX_NS}}}navMap")
+    for index, (target_id, label) in enumerate(nav_targets, 1):
+        nav_point = etree.SubElement(navmap, f"{{{NCX_NS}}}navPoint", id=f"ncx_{index}")
+        nav_point.set("class", "level1")
+        nav_label = etree.SubElement(nav_point, f"{{{NCX_NS}}}navLabel")
+        etree.SubElement(nav_label, f"{{{NCX_NS}}}text").text = label
+        etree.SubElement(nav_point, f"{{{NCX_NS}}}content", src=f"dtbook.smil#smil_par_{target_id}")
+    etree.ElementTree(ncx).write(os.path.join(daisy_dir, "dtbook.ncx"), xml_declaration=True, encoding="utf-8")
+
+
+def section_texts(output_dir):
+    """생성된 섹션 XHTML(title page 제외)의 내용을 파일 번호 순서로 돌려줍니다."""
+    epub_dir = os.path.join(output_dir, "EPUB")
+    names = [name for name in os.listdir(epub_dir) if name.startswith("dtbook-") and name != "dtbook-1.xhtml"]
+    names.sort(key=lambda name: int(name[len("dtbook-"):-len(".xhtml")]))
+    texts = []
+    for name in names:
+        with open(os.path.join(epub_dir, name), encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+IN_ORDER = [("sec_1", "첫째 장"), ("sec_2", "둘째 장"), ("sec_3", "셋째 장")]
+DUPLICATE = IN_ORDER + [("sec_1", "첫째 장 다시")]
+INNER = IN_ORDER + [("p_1", "첫째 장 본문 바로가기")]
+REVERSED = IN_ORDER[::-1]
+COMBINED = REVERSED + [("sec_3", "셋째 장 다시"), ("p_1", "첫째 장 본문 바로가기")]
+
+
+@pytest.mark.parametrize(
+    "nav_targets, expected_texts",
+    [
+        (DUPLICATE, ["첫째 장 본문", "둘째 장 본문", "셋째 장 본문", "첫째 장 본문"]),
+        (INNER, ["첫째 장 본문", "둘째 장 본문", "셋째 장 본문", "첫째 장 본문"]),
+        (REVERSED, ["셋째 장 본문", "둘째 장 본문", "첫째 장 본문"]),
+        (COMBINED, ["셋째 장 본문", "둘째 장 본문", "첫째 장 본문", "셋째 장 본문", "첫째 장 본문"]),
+    ],
+    ids=["duplicate", "inner", "reversed", "combined"],
+)
+def test_every_level1_nav_point_gets_a_section(tmp_path, nav_targets, expected_texts):
+    daisy_dir = tmp_path / "daisy"
+    output_dir = tmp_path / "epub"
+    daisy_dir.mkdir()
+    write_daisy_dir(str(daisy_dir), nav_targets)
+
+    create_epub3_from_daisy(str(daisy_dir), str(output_dir))
+
+    texts = section_texts(str(output_dir))
+    assert len(texts) == len(nav_targets)
+    for text, expected in zip(texts, expected_texts):
+        assert expected in text
+    # 다른 장의 본문이 섞여 들어가지 않았는지 확인
+    for text, expected in zip(texts, expected_texts):
+        others = [body for _, _, _, body in SECTIONS if body != expected]
+        assert not any(other in text for other in others)
+
+    with open(os.path.join(str(output_dir), "EPUB", "nav.xhtml"), encoding="utf-8") as f:
+        nav_xhtml = f.read()
+    for _, label in nav_targets:
+        assert label in nav_xhtml